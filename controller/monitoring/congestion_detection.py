@@ -1,6 +1,15 @@
-import requests
+import os
+import signal
+import sys
 import time
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from controller.utils.port_metadata import PortMetadataCache
+from controller.utils.port_stats import fetch_port_counters
+from controller.utils.monitor_log import CycleLog
+from controller.utils.snapshot import Snapshotter, load_snapshot
+from controller.utils.profiler import install_signal_trigger
+
 # ==============================
 # ONOS CONFIGURATION
 # ==============================
@@ -10,7 +19,7 @@ AUTH = ("onos", "rocks")
 # ==============================
 # LINK & THRESHOLDS
 # ==============================
-LINK_CAPACITY_BPS = 100_000_000  # 100 Mbps (consistent with dashboard)
+LINK_CAPACITY_BPS = 100_000_000  # fallback when ONOS reports no port speed
 U_HIGH = 0.8        # 80% utilization
 U_MID = 0.6         # 60% utilization
 G_HIGH = 0.08       # growth rate threshold
@@ -20,96 +29,110 @@ MIN_TRAFFIC_BPS = 1_000_000  # 1 Mbps (filter idle ports)
 # STORAGE FOR PREVIOUS VALUES
 # ==============================
 previous_stats = {}
+port_meta = PortMetadataCache(f"{ONOS_IP}/onos/v1", AUTH, default_capacity_bps=LINK_CAPACITY_BPS)
+
+# state transitions + periodic summaries -> logs/module4.jsonl
+cycle_log = CycleLog("module4", initial_state="NORMAL")
+
+# warm start: per-port counters are snapshotted to state/module4.snap
+snapshots = Snapshotter("module4", lambda: {"previous_stats": previous_stats})
+
+def restore_state():
+    snap = load_snapshot("module4")
+    if snap:
+        previous_stats.update(snap["previous_stats"])
+        print(f"[SNAPSHOT] Restored {len(previous_stats)} ports")
 
 # ==============================
 # FETCH PORT STATS FROM ONOS
 # ==============================
 def get_port_stats():
-    url = f"{ONOS_IP}/onos/v1/statistics/ports"
-    response = requests.get(url, auth=AUTH)
-    return response.json()["statistics"]
+    # only device/port/bytesSent are decoded, see controller/utils/port_stats.py
+    return fetch_port_counters(f"{ONOS_IP}/onos/v1", AUTH)
 
 # ==============================
 # CONGESTION DETECTION LOGIC
 # ==============================
 def detect_congestion():
+    cycle_log.begin_cycle()
     stats = get_port_stats()
+    port_meta.refresh_if_changed(stats.keys)
 
-    for device in stats:
-        device_id = device["device"]
-
-        for port in device["ports"]:
-            port_no = port["port"]
-            bytes_tx = port["bytesSent"]
-            current_time = time.time()
-
-            key = f"{device_id}:{port_no}"
-
-            # First sample (initialize)
-            if key not in previous_stats:
-                previous_stats[key] = {
-                    "bytes": bytes_tx,
-                    "time": current_time,
-                    "utilization": 0.0
-                }
-                continue
-
-            prev = previous_stats[key]
-
-            delta_bytes = bytes_tx - prev["bytes"]
-            delta_time = current_time - prev["time"]
-
-            if delta_time <= 0:
-                continue
-
-            # Traffic rate in bps
-            traffic_rate = (delta_bytes * 8) / delta_time
-
-            # 🔹 FILTER IDLE PORTS
-            if traffic_rate < MIN_TRAFFIC_BPS:
-                continue
-
-            # Utilization
-            utilization = traffic_rate / LINK_CAPACITY_BPS
-
-            # Growth rate
-            growth_rate = (utilization - prev["utilization"]) / delta_time
-
-            # ==============================
-            # STATE CLASSIFICATION
-            # ==============================
-            if utilization >= U_HIGH:
-                state = "CONGESTED"
-            elif utilization >= U_MID and growth_rate > G_HIGH:
-                state = "POTENTIAL_CONGESTION"
-            elif growth_rate > G_HIGH:
-                state = "CONGESTED"
-            else:
-                state = "NORMAL"
-
-            # ==============================
-            # OUTPUT
-            # ==============================
-            print(
-                f"[{key}] "
-                f"U={utilization:.2f} "
-                f"dU/dt={growth_rate:.2f} "
-                f"STATE={state}"
-            )
-
-            # Update previous values
+    for key, bytes_tx in stats:
+        current_time = time.time()
+
+        # First sample (initialize)
+        if key not in previous_stats:
             previous_stats[key] = {
                 "bytes": bytes_tx,
                 "time": current_time,
-                "utilization": utilization
+                "utilization": 0.0
             }
+            continue
+
+        prev = previous_stats[key]
+
+        delta_bytes = bytes_tx - prev["bytes"]
+        delta_time = current_time - prev["time"]
+
+        if delta_time <= 0:
+            continue
+
+        # Traffic rate in bps
+        traffic_rate = (delta_bytes * 8) / delta_time
+
+        # 🔹 FILTER IDLE PORTS
+        if traffic_rate < MIN_TRAFFIC_BPS:
+            cycle_log.observe(key, "NORMAL")
+            continue
+
+        # Utilization against the port's real speed
+        utilization = traffic_rate / port_meta.capacity_bps(key)
+
+        # Growth rate
+        growth_rate = (utilization - prev["utilization"]) / delta_time
+
+        # ==============================
+        # STATE CLASSIFICATION
+        # ==============================
+        if utilization >= U_HIGH:
+            state = "CONGESTED"
+        elif utilization >= U_MID and growth_rate > G_HIGH:
+            state = "POTENTIAL_CONGESTION"
+        elif growth_rate > G_HIGH:
+            state = "CONGESTED"
+        else:
+            state = "NORMAL"
+
+        # ==============================
+        # OUTPUT (transitions only)
+        # ==============================
+        cycle_log.observe(key, state, u=utilization, du_dt=growth_rate)
+
+        # Update previous values
+        previous_stats[key] = {
+            "bytes": bytes_tx,
+            "time": current_time,
+            "utilization": utilization
+        }
+
+    cycle_log.end_cycle()
 
 # ==============================
 # MAIN LOOP
 # ==============================
 if __name__ == "__main__":
     print("=== Module 4: Congestion Detection Started ===")
-    while True:
-        detect_congestion()
-        time.sleep(2)
+    restore_state()
+    # turn SIGTERM (stop_system.sh) into a normal exit so the final snapshot is written
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # `kill -USR2 <pid>` samples the live loop into logs/profile-module4-*
+    install_signal_trigger("module4")
+    try:
+        while True:
+            detect_congestion()
+            snapshots.maybe_save()
+            time.sleep(2)
+    finally:
+        snapshots.save_now()
 
@@ -0,0 +1,241 @@
+"""
+Elephant-flow detection for congested ports.
+
+For each congested port, the flows that leave the device through it are fed
+into a weighted space-saving summary with a fixed number of counters, which
+keeps the heaviest flows (with bounded over-estimation) whatever the number
+of flow entries. The reroute logic takes the top flows, with their ONOS
+selector criteria, and moves only as many as are needed to relieve the port.
+
+Flow rates come from ONOS flow stats: the byte delta since the previous cycle
+for flows that were heavy last cycle (bounded cache), and bytes / life for
+every other flow, so no per-flow history is kept for the long tail.
+
+A device's flow table is streamed: `iter_flows` decodes the `/flows/{id}`
+body one flow entry at a time as it arrives, so memory stays at one read
+chunk plus one flow, not the whole table, before anything reaches a summary.
+"""
+import codecs
+import heapq
+import json
+import time
+
+import requests
+
+ONOS_URL = "http://127.0.0.1:8181/onos/v1"
+AUTH = ("onos", "rocks")
+
+SKETCH_COUNTERS = 64      # space-saving counters per congested port
+TRACKED_PER_PORT = 16     # heavy flows whose byte counters we remember
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class SpaceSaving:
+    """Weighted space-saving top-k summary with `capacity` counters.
+
+    `count` over-estimates an item's true weight by at most its `error`,
+    and every item heavier than total / capacity is guaranteed to be kept.
+    """
+
+    def __init__(self, capacity=SKETCH_COUNTERS):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0.0
+        self._heap = []  # (count, key), may hold stale entries
+
+    def add(self, key, weight):
+        """Add `weight` to `key`; returns the key evicted to make room, if any."""
+        victim = None
+        self.total += weight
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0.0
+        else:
+            victim, floor = self._pop_min()
+            del self.counts[victim]
+            del self.errors[victim]
+            self.counts[key] = floor + weight
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, k) for k, c in self.counts.items()]
+            heapq.heapify(self._heap)
+        return victim
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return key, count
+
+    def top(self, k=None):
+        """[(key, count, error)], heaviest first."""
+        items = sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)
+        if k is not None:
+            items = items[:k]
+        return [(key, count, self.errors[key]) for key, count in items]
+
+
+def iter_flows(chunks, field="flows"):
+    """Yield the entries of the top-level `field` array of a JSON body given
+    as byte chunks, one decoded object at a time.
+
+    Only the undecoded rest of the body is buffered; it is compacted when
+    the next chunk is appended. An entry cut by the chunk boundary is
+    retried once more data has arrived.
+    """
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = None          # index in `buf` of the next array entry, once found
+    done = False
+    while True:
+        if pos is None:
+            start = buf.find(f'"{field}"')
+            bracket = buf.find("[", start) if start >= 0 else -1
+            if bracket >= 0:
+                pos = bracket + 1
+        if pos is not None:
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                if pos >= len(buf):
+                    break
+                try:
+                    entry, end = _decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if done:
+                        raise
+                    break       # incomplete entry: read more
+                pos = end
+                yield entry
+        if done:
+            return
+        chunk = next(chunks, None)
+        if chunk is None:
+            done = True
+            buf += text.decode(b"", final=True)
+        else:
+            if pos is not None:
+                buf, pos = buf[pos:], 0
+            buf += text.decode(chunk)
+
+
+def _output_port(flow):
+    for ins in flow.get("treatment", {}).get("instructions", []):
+        if ins.get("type") == "OUTPUT":
+            return str(ins.get("port"))
+    return None
+
+
+class ElephantFlowMonitor:
+    def __init__(self, onos_url=ONOS_URL, auth=AUTH, counters=SKETCH_COUNTERS,
+                 tracked_per_port=TRACKED_PER_PORT, timeout=2):
+        self.onos_url = onos_url
+        self.auth = auth
+        self.counters = counters
+        self.tracked_per_port = tracked_per_port
+        self.timeout = timeout
+        self.sketches = {}
+        self.selectors = {}
+        # flow id -> (bytes, time) for flows that were heavy last cycle
+        self._tracked = {}
+
+    def get_flows(self, device_id):
+        """Stream the flow entries of `device_id` (see iter_flows)."""
+        with requests.get(f"{self.onos_url}/flows/{device_id}", auth=self.auth,
+                          timeout=self.timeout, stream=True) as r:
+            r.raise_for_status()
+            yield from iter_flows(r.iter_content(CHUNK_SIZE))
+
+    def update(self, congested_ports):
+        """Rebuild the heavy-hitter summaries for `congested_ports`.
+
+        Ports are "<device>:<port>" keys; only the devices that own them are
+        queried. Returns {port key: SpaceSaving}.
+        """
+        by_device = {}
+        for key in congested_ports:
+            device_id, port_no = key.rsplit(":", 1)
+            by_device.setdefault(device_id, set()).add(port_no)
+
+        now = time.time()
+        sketches = {key: SpaceSaving(self.counters) for key in congested_ports}
+        selectors = {}
+        seen = {}
+        for device_id, ports in by_device.items():
+            try:
+                # streamed: the device's table is never held in memory at once
+                for flow in self.get_flows(device_id):
+                    out_port = _output_port(flow)
+                    if out_port not in ports:
+                        continue
+                    fid = flow.get("id")
+                    nbytes = flow.get("bytes", 0)
+                    prev = self._tracked.get(fid)
+                    if prev and now > prev[1] and nbytes >= prev[0]:
+                        rate = (nbytes - prev[0]) * 8 / (now - prev[1])
+                    else:
+                        rate = nbytes * 8 / max(flow.get("life", 0), 1)
+                    if rate <= 0:
+                        continue
+                    key = f"{device_id}:{out_port}"
+                    evicted = sketches[key].add(fid, rate)
+                    # only flows currently in a summary are kept around
+                    seen.pop(evicted, None)
+                    seen[fid] = (nbytes, flow)
+            except Exception as e:
+                # a stream cut mid-way keeps what was summarized so far
+                print(f"[ELEPHANT] Flow stats for {device_id} unavailable:", e)
+
+        # remember byte counters (and selectors) of the current heavy flows only
+        tracked = {}
+        for key, sketch in sketches.items():
+            for fid, _, _ in sketch.top(self.tracked_per_port):
+                nbytes, flow = seen[fid]
+                tracked[fid] = (nbytes, now)
+                selectors[fid] = {
+                    "deviceId": flow.get("deviceId"),
+                    "priority": flow.get("priority", 0),
+                    "selector": flow.get("selector", {"criteria": []}),
+                }
+        self._tracked = tracked
+        self.sketches = sketches
+        self.selectors = selectors
+        return sketches
+
+    def heavy_flows(self, port_key, k=None):
+        """Heaviest flows leaving `port_key`, heaviest first:
+        [{"id", "rate_bps", "error_bps", "deviceId", "priority", "selector"}]."""
+        sketch = self.sketches.get(port_key)
+        if sketch is None:
+            return []
+        out = []
+        for fid, count, error in sketch.top(k or self.tracked_per_port):
+            info = self.selectors.get(fid)
+            if info is None:
+                continue
+            out.append(dict(info, id=fid, rate_bps=count, error_bps=error))
+        return out
+
+    def flows_to_relieve(self, port_key, excess_bps, movable=None):
+        """Smallest prefix of the heaviest flows whose rate covers `excess_bps`,
+        skipping flows for which `movable(flow)` is false."""
+        chosen = []
+        moved = 0.0
+        for flow in self.heavy_flows(port_key):
+            if moved >= excess_bps:
+                break
+            if movable is not None and not movable(flow):
+                continue
+            # use the guaranteed part of the estimate when deciding coverage
+            moved += flow["rate_bps"] - flow["error_bps"]
+            chosen.append(flow)
+        return chosen
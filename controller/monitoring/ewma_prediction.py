@@ -1,6 +1,15 @@
-import requests
+import os
+import signal
+import sys
 import time
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from controller.utils.port_metadata import PortMetadataCache
+from controller.utils.port_stats import fetch_port_counters
+from controller.utils.monitor_log import CycleLog
+from controller.utils.snapshot import Snapshotter, load_snapshot
+from controller.utils.profiler import install_signal_trigger
+
 # ==============================
 # ONOS CONFIG
 # ==============================
@@ -10,7 +19,7 @@ AUTH = ("onos", "rocks")
 # ==============================
 # PARAMETERS
 # ==============================
-LINK_CAPACITY_BPS = 100_000_000  # 100 Mbps (consistent with dashboard)
+LINK_CAPACITY_BPS = 100_000_000  # fallback when ONOS reports no port speed
 MIN_TRAFFIC_BPS = 1_000_000        # 1 Mbps filter
 
 ALPHA = 0.6                        # EWMA smoothing factor
@@ -21,176 +30,104 @@ PRED_CONGESTION_THRESHOLD = 0.75   # 75% predicted utilization
 # ==============================
 previous_stats = {}
 ewma_state = {}
+port_meta = PortMetadataCache(f"{ONOS_IP}/onos/v1", AUTH, default_capacity_bps=LINK_CAPACITY_BPS)
+
+# state transitions + periodic summaries -> logs/module5.jsonl
+cycle_log = CycleLog("module5", initial_state="SAFE")
+
+# warm start: counters and EWMA state are snapshotted to state/module5.snap
+snapshots = Snapshotter("module5", lambda: {"previous_stats": previous_stats,
+                                            "ewma_state": ewma_state})
+
+def restore_state():
+    snap = load_snapshot("module5")
+    if snap:
+        previous_stats.update(snap["previous_stats"])
+        ewma_state.update(snap["ewma_state"])
+        print(f"[SNAPSHOT] Restored {len(previous_stats)} ports")
 
 # ==============================
 # FETCH PORT STATS
 # ==============================
 def get_port_stats():
-    url = f"{ONOS_IP}/onos/v1/statistics/ports"
-    response = requests.get(url, auth=AUTH)
-    return response.json()["statistics"]
+    # only device/port/bytesSent are decoded, see controller/utils/port_stats.py
+    return fetch_port_counters(f"{ONOS_IP}/onos/v1", AUTH)
 
 # ==============================
 # EWMA PREDICTION LOGIC
 # ==============================
 def predict_congestion():
+    cycle_log.begin_cycle()
     stats = get_port_stats()
+    port_meta.refresh_if_changed(stats.keys)
 
-    for device in stats:
-        device_id = device["device"]
-
-        for port in device["ports"]:
-            port_no = port["port"]
-            bytes_tx = port["bytesSent"]
-            now = time.time()
-
-            key = f"{device_id}:{port_no}"
-
-            # Initialize
-            if key not in previous_stats:
-                previous_stats[key] = {
-                    "bytes": bytes_tx,
-                    "time": now,
-                    "util": 0.0
-                }
-                ewma_state[key] = 0.0
-                continue
-
-            prev = previous_stats[key]
-            delta_bytes = bytes_tx - prev["bytes"]
-            delta_time = now - prev["time"]
-
-            if delta_time <= 0:
-                continue
-
-            traffic_rate = (delta_bytes * 8) / delta_time
-
-            if traffic_rate < MIN_TRAFFIC_BPS:
-                continue
-
-            utilization = traffic_rate / LINK_CAPACITY_BPS
-
-            # ==============================
-            # EWMA CALCULATION
-            # ==============================
-            ewma_prev = ewma_state.get(key, utilization)
-            ewma_current = ALPHA * utilization + (1 - ALPHA) * ewma_prev
-            ewma_state[key] = ewma_current
-
-            # ==============================
-            # PREDICTION STATE
-            # ==============================
-            if ewma_current >= PRED_CONGESTION_THRESHOLD:
-                prediction = "PREDICTED_CONGESTION"
-            else:
-                prediction = "SAFE"
-
-            print(
-                f"[{key}] "
-                f"U_now={utilization:.2f} "
-                f"U_pred={ewma_current:.2f} "
-                f"STATE={prediction}"
-            )
+    for key, bytes_tx in stats:
+        now = time.time()
 
+        # Initialize
+        if key not in previous_stats:
             previous_stats[key] = {
                 "bytes": bytes_tx,
                 "time": now,
-                "util": utilization
+                "util": 0.0
             }
+            ewma_state[key] = 0.0
+            continue
 
-# ==============================
-# MAIN LOOP
-# ==============================
-if __name__ == "__main__":
-    print("=== Module 5: EWMA Traffic Prediction Started ===")
-    while True:
-        predict_congestion()
-        time.sleep(2)
-requests
-ewma_state = {}
+        prev = previous_stats[key]
+        delta_bytes = bytes_tx - prev["bytes"]
+        delta_time = now - prev["time"]
 
-# ==============================
-# FETCH PORT STATS
-# ==============================
-def get_port_stats():
-   url = f"{ONOS_IP}/onos/v1/statistics/ports"
-   response = requests.get(url, auth=AUTH)
-   return response.json()["statistics"]
+        if delta_time <= 0:
+            continue
 
-# ==============================
-# EWMA PREDICTION LOGIC
-# ==============================
-def predict_congestion():
-   stats = get_port_stats()
-
-   for device in stats:
-       device_id = device["device"]
-
-       for port in device["ports"]:
-           port_no = port["port"]
-           bytes_tx = port["bytesSent"]
-           now = time.time()
-
-           key = f"{device_id}:{port_no}"
-
-           # Initialize
-           if key not in previous_stats:
-               previous_stats[key] = {
-                   "bytes": bytes_tx,
-                   "time": now,
-                   "util": 0.0
-               }
-               ewma_state[key] = 0.0
-               continue
-
-           prev = previous_stats[key]
-           delta_bytes = bytes_tx - prev["bytes"]
-           delta_time = now - prev["time"]
-
-           if delta_time <= 0:
-               continue
-
-           traffic_rate = (delta_bytes * 8) / delta_time
-
-           if traffic_rate < MIN_TRAFFIC_BPS:
-               continue
-
-           utilization = traffic_rate / LINK_CAPACITY_BPS
-
-           # ==============================
-           # EWMA CALCULATION
-           # ==============================
-           ewma_prev = ewma_state.get(key, utilization)
-           ewma_current = ALPHA * utilization + (1 - ALPHA) * ewma_prev
-           ewma_state[key] = ewma_current
-
-           # ==============================
-           # PREDICTION STATE
-           # ==============================
-           if ewma_current >= PRED_CONGESTION_THRESHOLD:
-               prediction = "PREDICTED_CONGESTION"
-           else:
-               prediction = "SAFE"
-
-           print(
-               f"[{key}] "
-               f"U_now={utilization:.2f} "
-               f"U_pred={ewma_current:.2f} "
-               f"STATE={prediction}"
-           )
-
-           previous_stats[key] = {
-               "bytes": bytes_tx,
-               "time": now,
-               "util": utilization
-           }
+        traffic_rate = (delta_bytes * 8) / delta_time
+
+        if traffic_rate < MIN_TRAFFIC_BPS:
+            cycle_log.observe(key, "SAFE")
+            continue
+
+        utilization = traffic_rate / port_meta.capacity_bps(key)
+
+        # ==============================
+        # EWMA CALCULATION
+        # ==============================
+        ewma_prev = ewma_state.get(key, utilization)
+        ewma_current = ALPHA * utilization + (1 - ALPHA) * ewma_prev
+        ewma_state[key] = ewma_current
+
+        # ==============================
+        # PREDICTION STATE
+        # ==============================
+        if ewma_current >= PRED_CONGESTION_THRESHOLD:
+            prediction = "PREDICTED_CONGESTION"
+        else:
+            prediction = "SAFE"
+
+        cycle_log.observe(key, prediction, u_now=utilization, u_pred=ewma_current)
+
+        previous_stats[key] = {
+            "bytes": bytes_tx,
+            "time": now,
+            "util": utilization
+        }
+
+    cycle_log.end_cycle()
 
 # ==============================
 # MAIN LOOP
 # ==============================
 if __name__ == "__main__":
-   print("=== Module 5: EWMA Traffic Prediction Started ===")
-   while True:
-       predict_congestion()
-       time.sleep(2)
-
+    print("=== Module 5: EWMA Traffic Prediction Started ===")
+    restore_state()
+    # turn SIGTERM (stop_system.sh) into a normal exit so the final snapshot is written
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # `kill -USR2 <pid>` samples the live loop into logs/profile-module5-*
+    install_signal_trigger("module5")
+    try:
+        while True:
+            predict_congestion()
+            snapshots.maybe_save()
+            time.sleep(2)
+    finally:
+        snapshots.save_now()
@@ -0,0 +1,289 @@
+"""
+Rate limiting of top-talking sources with ONOS meters.
+
+Rerouting cannot save the fabric from a flood that is bigger than the
+links, so when a port's predicted utilization passes the metering limit the
+sources of its heaviest flows are throttled where they enter the network:
+
+- each heavy flow's source host (ETH_SRC / IPV4_SRC) is located with
+  `/hosts`, which gives its ingress edge switch and port;
+- the sources share the bandwidth the port can still take, max-min fairly:
+  every source above a common level is capped at it, smaller ones (usually
+  TCP) are left alone;
+- on the edge switch, each forwarding flow of the source's port is copied
+  one priority higher with a METER instruction in front of its original
+  instructions (a DROP band at the source's cap).
+
+A meter's rate is changed by creating a new meter, re-posting the copies
+with its id (same selector and priority, so ONOS updates them in place) and
+deleting the old meter. A meter that has not dropped anything for a few
+sweeps is released: its flow copies and the meter are deleted.
+"""
+import threading
+
+import requests
+
+from controller.routing.paths import HostLocations, criterion
+
+ONOS_URL = "http://127.0.0.1:8181/onos/v1"
+AUTH = ("onos", "rocks")
+
+METER_TARGET = 0.7          # throttle until the port's prediction is back to this
+MIN_RATE_BPS = 1_000_000    # never cap a source below this
+RATE_TOLERANCE = 0.1        # keep the current meter if within 10% of the new rate
+RELEASE_SWEEPS = 3          # consecutive drop-free sweeps before a meter is released
+UDP = 17
+
+
+def fair_caps(demands, allowed):
+    """Max-min fair level: the rate r with sum(min(d, r)) == allowed.
+
+    Returns {source: r} for the sources whose demand is above r (the ones
+    that need a meter); {} when `allowed` already covers every demand.
+    """
+    if sum(demands.values()) <= allowed:
+        return {}
+    remaining = allowed
+    ordered = sorted(demands.items(), key=lambda kv: kv[1])
+    for i, (_, demand) in enumerate(ordered):
+        level = remaining / (len(ordered) - i)
+        if demand > level:
+            return {src: max(level, MIN_RATE_BPS) for src, _ in ordered[i:]}
+        remaining -= demand
+    return {}
+
+
+class Meter:
+    def __init__(self, device_id, port, meter_id, rate_bps, flows):
+        self.device_id = device_id
+        self.port = port                # edge port the source is attached to
+        self.meter_id = meter_id
+        self.rate_bps = rate_bps
+        self.flows = flows              # [(flow id, flow body)] of our metered copies
+        self.dropped_bytes = None
+        self.quiet_sweeps = 0
+
+    def to_dict(self):
+        return {"device": self.device_id, "port": self.port, "meter_id": self.meter_id,
+                "rate_bps": self.rate_bps, "flows": self.flows}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["device"], d["port"], d["meter_id"], d["rate_bps"], d["flows"])
+
+
+class MeterManager:
+    """Installs, retunes and releases per-source meters on edge switches.
+
+    All methods block on ONOS; reroute.py runs them on its I/O pool.
+    `lock` guards `meters` and the set of sources being changed, so
+    `to_dicts()` can copy them from the event loop mid-update.
+    """
+
+    def __init__(self, onos_url=ONOS_URL, auth=AUTH, timeout=2, hosts=None):
+        self.onos_url = onos_url
+        self.auth = auth
+        self.timeout = timeout
+        self.hosts = hosts or HostLocations(onos_url, auth, timeout)
+        self.meters = {}                # "<edge device>:<port>" -> Meter
+        self.lock = threading.Lock()
+        self._busy = set()              # sources a limit() / release() is changing
+
+    def to_dicts(self):
+        with self.lock:
+            return {src: m.to_dict() for src, m in self.meters.items()}
+
+    def _req(self, method, path, **kwargs):
+        return requests.request(method, f"{self.onos_url}{path}", auth=self.auth,
+                                timeout=self.timeout, **kwargs)
+
+    # ------------------------------
+    # SOURCES
+    # ------------------------------
+    def sources(self, flows):
+        """Group heavy flows (ElephantFlowMonitor.heavy_flows) by the edge
+        port their source host is attached to.
+
+        Returns ({"<device>:<port>": bps}, {sources sending UDP}); flows
+        whose source cannot be located are skipped.
+        """
+        hosts = self.hosts.table()
+        demands = {}
+        udp = set()
+        for f in flows:
+            criteria = f["selector"].get("criteria", [])
+            where = self.hosts.source(criteria, hosts)
+            if where is None:
+                continue
+            key = f"{where[0]}:{where[1]}"
+            demands[key] = demands.get(key, 0.0) + f["rate_bps"]
+            if (criterion(criteria, "IP_PROTO") or {}).get("protocol") == UDP:
+                udp.add(key)
+        return demands, udp
+
+    def plan(self, flows, allowed_bps):
+        """Meter rates {source: bps} so the sources of `flows` fit in
+        `allowed_bps`. UDP sources absorb the cut first; the others are
+        only capped when throttling UDP alone cannot free enough."""
+        demands, udp = self.sources(flows)
+        other_bps = sum(d for src, d in demands.items() if src not in udp)
+        udp_demands = {src: d for src, d in demands.items() if src in udp}
+        if udp_demands and allowed_bps - other_bps >= MIN_RATE_BPS * len(udp_demands):
+            return fair_caps(udp_demands, allowed_bps - other_bps)
+        return fair_caps(demands, allowed_bps)
+
+    # ------------------------------
+    # METERS
+    # ------------------------------
+    def _add_meter(self, device_id, rate_bps):
+        kbps = max(int(rate_bps / 1000), 1)
+        r = self._req("POST", f"/meters/{device_id}", json={
+            "deviceId": device_id,
+            "unit": "KB_PER_SEC",
+            "burst": True,
+            "bands": [{"type": "DROP", "rate": str(kbps), "burstSize": str(max(kbps // 10, 1))}],
+        })
+        r.raise_for_status()
+        # Location: .../meters/{deviceId}/{meterId}
+        return r.headers.get("Location", "").rstrip("/").rsplit("/", 1)[-1]
+
+    def _edge_flows(self, device_id, port):
+        """Forwarding flows taking traffic in on `port`, minus our own copies."""
+        out = []
+        for f in self._req("GET", f"/flows/{device_id}").json().get("flows", []):
+            criteria = f.get("selector", {}).get("criteria", [])
+            in_port = criterion(criteria, "IN_PORT")
+            instructions = f.get("treatment", {}).get("instructions", [])
+            if (not in_port or str(in_port.get("port")) != port
+                    or any(i.get("type") == "METER" for i in instructions)
+                    or not any(i.get("type") == "OUTPUT" for i in instructions)):
+                continue
+            out.append(f)
+        return out
+
+    def _post_metered(self, device_id, meter_id, flow):
+        r = self._req("POST", f"/flows/{device_id}", json=flow_with_meter(flow, meter_id))
+        r.raise_for_status()
+        return r.headers.get("Location", "").rstrip("/").rsplit("/", 1)[-1]
+
+    def _claim(self, source):
+        """Mark `source` as being changed; False if another call already is.
+
+        A call abandoned by its caller's deadline keeps running on its
+        thread, so the next cycle must not start a second meter beside it.
+        """
+        with self.lock:
+            if source in self._busy:
+                return False
+            self._busy.add(source)
+            return True
+
+    def _unclaim(self, source):
+        with self.lock:
+            self._busy.discard(source)
+
+    def limit(self, source, rate_bps):
+        """Cap `source` ("<edge device>:<port>") at `rate_bps`.
+
+        Returns True if a meter was installed or retuned; False when the
+        current one is close enough or `source` is still being changed by
+        an earlier call. If a step fails, the new meter and the copies
+        already posted are rolled back before the error is raised.
+        """
+        if not self._claim(source):
+            return False
+        try:
+            meter = self.meters.get(source)
+            if meter is not None and abs(meter.rate_bps - rate_bps) <= RATE_TOLERANCE * meter.rate_bps:
+                return False
+            device_id, port = source.rsplit(":", 1)
+            if meter is None:
+                bodies = [{"priority": f.get("priority", 0) + 1, "timeout": 0, "isPermanent": True,
+                           "deviceId": device_id, "selector": f.get("selector", {}),
+                           "treatment": f.get("treatment", {})}
+                          for f in self._edge_flows(device_id, port)]
+                if not bodies:
+                    return False
+            else:
+                bodies = [body for _, body in meter.flows]
+
+            meter_id = self._add_meter(device_id, rate_bps)
+            flows = []
+            try:
+                for body in bodies:
+                    flows.append((self._post_metered(device_id, meter_id, body), body))
+            except Exception:
+                self._roll_back(device_id, meter, meter_id, flows)
+                raise
+            if meter is not None:
+                self._req("DELETE", f"/meters/{device_id}/{meter.meter_id}")
+            with self.lock:
+                self.meters[source] = Meter(device_id, port, meter_id, rate_bps, flows)
+            return True
+        finally:
+            self._unclaim(source)
+
+    def _roll_back(self, device_id, meter, meter_id, posted):
+        """Undo a failed limit(): copies already posted go back to the old
+        meter (or are deleted when there was none), then the new meter is
+        deleted. Best effort; what fails here is only logged."""
+        try:
+            for flow_id, body in posted:
+                if meter is not None:
+                    self._post_metered(device_id, meter.meter_id, body)
+                else:
+                    self._req("DELETE", f"/flows/{device_id}/{flow_id}")
+            self._req("DELETE", f"/meters/{device_id}/{meter_id}")
+        except Exception as e:
+            print(f"[METER] Rollback of meter {meter_id} on {device_id} failed:", repr(e))
+
+    def release(self, source):
+        if not self._claim(source):
+            return
+        try:
+            with self.lock:
+                meter = self.meters.pop(source, None)
+            if meter is None:
+                return
+            for flow_id, _ in meter.flows:
+                self._req("DELETE", f"/flows/{meter.device_id}/{flow_id}")
+            self._req("DELETE", f"/meters/{meter.device_id}/{meter.meter_id}")
+        finally:
+            self._unclaim(source)
+
+    def sweep(self, keep=()):
+        """Release meters that dropped nothing for RELEASE_SWEEPS sweeps.
+
+        Sources in `keep` (still feeding an over-limit port) are not
+        released. Returns the released sources.
+        """
+        released = []
+        with self.lock:
+            current = list(self.meters.items())
+        for source, meter in current:
+            r = self._req("GET", f"/meters/{meter.device_id}/{meter.meter_id}")
+            meters = r.json().get("meters", []) if r.status_code == 200 else []
+            dropped = sum(b.get("bytes", 0) for m in meters for b in m.get("bands", []))
+            if meter.dropped_bytes is not None and dropped <= meter.dropped_bytes and source not in keep:
+                meter.quiet_sweeps += 1
+            else:
+                meter.quiet_sweeps = 0
+            meter.dropped_bytes = dropped
+            if meter.quiet_sweeps >= RELEASE_SWEEPS:
+                self.release(source)
+                released.append(source)
+        return released
+
+    def release_all(self):
+        with self.lock:
+            sources = list(self.meters)
+        for source in sources:
+            self.release(source)
+
+
+def flow_with_meter(flow, meter_id):
+    """`flow` with a METER instruction ahead of its own instructions."""
+    instructions = [i for i in flow.get("treatment", {}).get("instructions", [])
+                    if i.get("type") != "METER"]
+    return dict(flow, treatment={"instructions": [{"type": "METER", "meterId": str(meter_id)}]
+                                 + instructions})
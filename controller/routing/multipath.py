@@ -0,0 +1,226 @@
+"""
+Multipath load balancing with ONOS SELECT groups.
+
+Instead of moving a congested port's heavy flows wholesale onto one other
+port (which tends to just move the hotspot), the flows are pointed at a
+SELECT group whose buckets output on the congested port and its alternates.
+The switch hashes each flow onto a bucket in proportion to the bucket
+weights.
+
+Weights come from water-filling: the group's own traffic is spread over
+the ports so that the most utilized of them ends up as low as possible,
+given each port's capacity and its background load (predicted load minus
+what the group itself sends there, measured from the bucket byte counters).
+The solve is a sort over the handful of ports, so it runs every cycle.
+
+Weight changes are applied to the existing group (new buckets added, old
+ones removed) so the flows pointing at it are never touched.
+"""
+import threading
+import time
+import zlib
+
+import requests
+
+ONOS_URL = "http://127.0.0.1:8181/onos/v1"
+AUTH = ("onos", "rocks")
+
+GROUP_ID_BASE = 0x5D000000   # group ids / app cookies owned by this module
+TOTAL_WEIGHT = 100           # bucket weights sum to this
+MIN_WEIGHT = 1               # keep every path in the group, however cold
+WEIGHT_STEP = 5              # ignore re-solves that move no weight by this much
+MAX_PATHS = 4                # congested port + up to 3 alternates
+
+
+# ==============================
+# WEIGHT SOLVER
+# ==============================
+def water_fill(capacity, background, demand):
+    """Split `demand` (bps) over ports to minimize the highest utilization.
+
+    Fills the least utilized ports first, up to a common level L, so that
+    every port with a share ends at utilization L:
+    share_i = max(0, L * capacity_i - background_i), sum(share) = demand.
+    """
+    n = len(capacity)
+    order = sorted(range(n), key=lambda i: background[i] / capacity[i])
+    shares = [0.0] * n
+    cap_sum = bg_sum = 0.0
+    level = 0.0
+    for j, i in enumerate(order):
+        cap_sum += capacity[i]
+        bg_sum += background[i]
+        level = (demand + bg_sum) / cap_sum
+        nxt = order[j + 1] if j + 1 < n else None
+        if nxt is None or level <= background[nxt] / capacity[nxt]:
+            break
+    for i in order:
+        shares[i] = max(0.0, level * capacity[i] - background[i])
+    return shares
+
+
+def solve_weights(capacity, background, demand, total=TOTAL_WEIGHT, min_weight=MIN_WEIGHT):
+    """Integer bucket weights summing to `total` for the water-filled split.
+
+    Every port keeps at least `min_weight`; the rest is distributed by
+    largest remainder.
+    """
+    n = len(capacity)
+    shares = water_fill(capacity, background, demand) if demand > 0 else list(capacity)
+    spare = total - min_weight * n
+    scale = spare / (sum(shares) or 1.0)
+    exact = [s * scale for s in shares]
+    weights = [min_weight + int(e) for e in exact]
+    for i in sorted(range(n), key=lambda i: exact[i] - int(exact[i]), reverse=True)[:total - sum(weights)]:
+        weights[i] += 1
+    return weights
+
+
+# ==============================
+# GROUP MANAGEMENT
+# ==============================
+def _bucket(port, weight):
+    return {"weight": weight,
+            "treatment": {"instructions": [{"type": "OUTPUT", "port": str(port)}]}}
+
+
+def _bucket_port(bucket):
+    for ins in bucket.get("treatment", {}).get("instructions", []):
+        if ins.get("type") == "OUTPUT":
+            return str(ins.get("port"))
+    return None
+
+
+class MultipathGroup:
+    def __init__(self, key, device_id, group_id, ports, weights):
+        self.key = key                  # congested port the group relieves
+        self.device_id = device_id
+        self.group_id = group_id
+        self.cookie = hex(group_id)
+        self.ports = list(ports)        # output port numbers, congested first
+        self.weights = list(weights)
+        self.bucket_bytes = {}          # port -> (bytes, time) at last poll
+
+    def to_dict(self):
+        return {"key": self.key, "device": self.device_id, "group_id": self.group_id,
+                "ports": self.ports, "weights": self.weights}
+
+
+class MultipathBalancer:
+    """Creates one SELECT group per relieved port and keeps its weights
+    matched to the current predicted loads.
+
+    Methods run on reroute.py's I/O threads; `lock` guards `groups` and
+    every group's ports/weights, so `to_dicts()` can copy them from the
+    event loop mid-update.
+    """
+
+    def __init__(self, onos_url=ONOS_URL, auth=AUTH, timeout=2):
+        self.onos_url = onos_url
+        self.auth = auth
+        self.timeout = timeout
+        self.groups = {}
+        self.lock = threading.Lock()
+
+    def to_dicts(self):
+        with self.lock:
+            return [g.to_dict() for g in self.groups.values()]
+
+    def _url(self, group, suffix=""):
+        return f"{self.onos_url}/groups/{group.device_id}/{group.cookie}{suffix}"
+
+    @staticmethod
+    def group_id_for(key):
+        # stable across restarts, so an existing group is found again
+        return GROUP_ID_BASE + (zlib.crc32(key.encode()) & 0xFFFFFF)
+
+    def create(self, key, ports, weights):
+        """Install (or adopt) the SELECT group for `key`; returns it, or None."""
+        device_id = key.rsplit(":", 1)[0]
+        group = MultipathGroup(key, device_id, self.group_id_for(key), ports, weights)
+        body = {
+            "type": "SELECT",
+            "appCookie": group.cookie,
+            "groupId": str(group.group_id),
+            "buckets": [_bucket(p, w) for p, w in zip(ports, weights)],
+        }
+        try:
+            if self._get_group(group) is None:
+                r = requests.post(f"{self.onos_url}/groups/{device_id}", json=body,
+                                  auth=self.auth, timeout=self.timeout)
+                if r.status_code not in (200, 201):
+                    print("[MULTIPATH] Group install failed:", r.text)
+                    return None
+                print(f"[MULTIPATH] Group {group.cookie} on {device_id}: ports {ports} weights {weights}")
+            else:
+                self._set_buckets(group, ports, weights)
+        except Exception as e:
+            print("[MULTIPATH] Group install failed:", e)
+            return None
+        with self.lock:
+            self.groups[key] = group
+        return group
+
+    def remove(self, key):
+        with self.lock:
+            group = self.groups.pop(key, None)
+        if group is not None:
+            try:
+                requests.delete(self._url(group), auth=self.auth, timeout=self.timeout)
+            except Exception as e:
+                print("[MULTIPATH] Group delete failed:", e)
+
+    def _get_group(self, group):
+        r = requests.get(self._url(group), auth=self.auth, timeout=self.timeout)
+        if r.status_code == 404:
+            return None
+        groups = r.json().get("groups", [])
+        return groups[0] if groups else None
+
+    def _set_buckets(self, group, ports, weights):
+        """Swap the group's buckets in place: add the new ones, then delete
+        the old ones, so the group is never empty."""
+        current = self._get_group(group) or {}
+        old_ids = [str(b["bucketId"]) for b in current.get("buckets", []) if "bucketId" in b]
+        requests.post(self._url(group, "/buckets"),
+                      json={"buckets": [_bucket(p, w) for p, w in zip(ports, weights)]},
+                      auth=self.auth, timeout=self.timeout).raise_for_status()
+        if old_ids:
+            requests.delete(self._url(group, "/buckets/" + ",".join(old_ids)),
+                            auth=self.auth, timeout=self.timeout).raise_for_status()
+        with self.lock:
+            group.ports = list(ports)
+            group.weights = list(weights)
+
+    def rebalance(self, group, loads):
+        """Re-solve `group`'s weights; `loads` maps every port key of the
+        group to (capacity_bps, predicted utilization).
+
+        Returns the new weights when they were applied, else None.
+        """
+        current = self._get_group(group)
+        if current is None:
+            return None
+        now = time.time()
+        own = {}
+        for b in current.get("buckets", []):
+            port = _bucket_port(b)
+            nbytes = b.get("bytes", 0)
+            prev = group.bucket_bytes.get(port)
+            if prev and now > prev[1] and nbytes >= prev[0]:
+                own[port] = (nbytes - prev[0]) * 8 / (now - prev[1])
+            group.bucket_bytes[port] = (nbytes, now)
+        if len(own) < len(group.ports):
+            return None  # first poll (or new buckets): no rates yet
+
+        capacity, background = [], []
+        for port in group.ports:
+            cap, pred = loads[f"{group.device_id}:{port}"]
+            capacity.append(cap)
+            background.append(max(pred * cap - own[port], 0.0))
+        weights = solve_weights(capacity, background, sum(own.values()))
+        if max(abs(a - b) for a, b in zip(weights, group.weights)) < WEIGHT_STEP:
+            return None
+        self._set_buckets(group, group.ports, weights)
+        group.bucket_bytes = {}  # new buckets start their own counters
+        return weights
@@ -0,0 +1,131 @@
+"""
+Next hops towards a flow's destination, from the cached topology.
+
+A flow may only be moved to a port that still leads to its destination:
+
+- the destination host (ETH_DST / IPV4_DST) is located with `/hosts`,
+  which gives the edge switch it is attached to;
+- every switch's hop distance to that edge switch comes from a BFS over
+  the links in PortMetadataCache (cached per topology version);
+- a port of device D is a next hop when the link leaving it reaches a
+  switch N with dist(N) <= dist(D). N's own shortest path then never comes
+  back through D, so the move is loop-free. dist(N) == dist(D) - 1 are the
+  equal-cost next hops; dist(N) == dist(D) are the longer, unequal-cost
+  ones.
+
+The flow's ingress port is always excluded. On a tree there is exactly one
+next hop per destination, so nothing is ever moved sideways.
+"""
+import time
+from collections import deque
+
+import requests
+
+ONOS_URL = "http://127.0.0.1:8181/onos/v1"
+AUTH = ("onos", "rocks")
+
+HOSTS_MAX_AGE = 60          # seconds between /hosts reloads
+
+
+def criterion(criteria, ctype):
+    for c in criteria:
+        if c.get("type") == ctype:
+            return c
+    return None
+
+
+class HostLocations:
+    """{mac or ip: (edge device, port)} from /hosts, reloaded every
+    HOSTS_MAX_AGE seconds. `table()` blocks on ONOS when it reloads."""
+
+    def __init__(self, onos_url=ONOS_URL, auth=AUTH, timeout=2, max_age=HOSTS_MAX_AGE):
+        self.onos_url = onos_url
+        self.auth = auth
+        self.timeout = timeout
+        self.max_age = max_age
+        self._cached = ({}, 0.0)    # (table, loaded at), replaced as a whole
+
+    def table(self):
+        hosts, loaded_at = self._cached
+        if time.time() - loaded_at > self.max_age:
+            r = requests.get(f"{self.onos_url}/hosts", auth=self.auth, timeout=self.timeout)
+            hosts = {}
+            for h in r.json().get("hosts", []):
+                locs = h.get("locations") or []
+                if not locs:
+                    continue
+                where = (locs[0].get("elementId"), str(locs[0].get("port")))
+                hosts[h.get("mac", "").lower()] = where
+                for ip in h.get("ipAddresses", []):
+                    hosts[ip] = where
+            self._cached = (hosts, time.time())
+        return hosts
+
+    def source(self, criteria, hosts):
+        """(device, port) of the host matched by ETH_SRC / IPV4_SRC, or None."""
+        return self._locate(criteria, "ETH_SRC", "IPV4_SRC", hosts)
+
+    def destination(self, criteria, hosts):
+        """(device, port) of the host matched by ETH_DST / IPV4_DST, or None."""
+        return self._locate(criteria, "ETH_DST", "IPV4_DST", hosts)
+
+    @staticmethod
+    def _locate(criteria, mac_type, ip_type, hosts):
+        mac = criterion(criteria, mac_type)
+        ip = criterion(criteria, ip_type)
+        where = None
+        if mac:
+            where = hosts.get(mac.get("mac", "").lower())
+        if where is None and ip:
+            where = hosts.get(ip.get("ip", "").split("/")[0])
+        return where
+
+
+class PathFinder:
+    def __init__(self, port_meta):
+        self.port_meta = port_meta
+        self._graph = (None, {}, {}, {})   # (version, out, into, distances by target)
+
+    def _current(self):
+        tables = self.port_meta.tables
+        graph = self._graph
+        if graph[0] != tables.version:
+            out = {}        # device -> [(port key, neighbour)]
+            into = {}       # device -> [devices with a link into it]
+            for l in tables.links:
+                if l["from"] == l["to"]:
+                    continue
+                out.setdefault(l["from"], []).append((l["src_key"], l["to"]))
+                into.setdefault(l["to"], []).append(l["from"])
+            graph = self._graph = (tables.version, out, into, {})
+        return graph
+
+    def distances(self, target):
+        """{device: hops to `target`} for every device that can reach it."""
+        _, _, into, cache = self._current()
+        dist = cache.get(target)
+        if dist is None:
+            dist = {target: 0}
+            queue = deque([target])
+            while queue:
+                node = queue.popleft()
+                for prev in into.get(node, ()):
+                    if prev not in dist:
+                        dist[prev] = dist[node] + 1
+                        queue.append(prev)
+            cache[target] = dist
+        return dist
+
+    def next_hops(self, device_id, target, exclude=()):
+        """[(hops left, port key)] of `device_id`'s loop-free next hops
+        towards `target`, shortest first; [] when `device_id` is `target`
+        or cannot reach it."""
+        _, out, _, _ = self._current()
+        dist = self.distances(target)
+        here = dist.get(device_id)
+        if not here:
+            return []
+        hops = [(dist[n], key) for key, n in out.get(device_id, ())
+                if key not in exclude and n in dist and dist[n] <= here
+                and self.port_meta.is_enabled(key)]
+        return sorted(hops)
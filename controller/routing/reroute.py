@@ -1,19 +1,57 @@
+import asyncio
+import functools
+import os
+import signal
+import sys
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from controller.utils.port_metadata import PortMetadataCache
+from controller.utils.port_stats import fetch_port_counters
+from controller.utils.monitor_log import CycleLog
+from controller.utils.hot_ports import HotPortIndex
+from controller.monitoring.elephant_flows import ElephantFlowMonitor
+from controller.routing.metering import METER_TARGET, Meter, MeterManager
+from controller.routing.multipath import MAX_PATHS, MultipathBalancer, MultipathGroup, solve_weights
+from controller.routing.paths import HostLocations, PathFinder, criterion
+from controller.utils.tracing import TraceRecorder
+from controller.utils.snapshot import Snapshotter, load_snapshot
+from controller.utils.profiler import install_signal_trigger
 
 # ==============================
 # ONOS CONFIG
 # ==============================
 ONOS_URL = "http://127.0.0.1:8181/onos/v1"
 AUTH = ("onos", "rocks")
+DASHBOARD_URL = "http://127.0.0.1:5000"
 
 # ==============================
 # PARAMETERS
 # ==============================
-LINK_CAPACITY_BPS = 100_000_000
+LINK_CAPACITY_BPS = 100_000_000  # fallback when ONOS reports no port speed
 ALPHA = 0.6
 PRED_THRESHOLD = 0.75
 CHECK_INTERVAL = 5
+RELIEF_TARGET = 0.6      # move enough heavy flows to bring the port down to this
+USE_MULTIPATH = True     # spread heavy flows over a SELECT group before moving them
+METER_LIMIT = 0.9        # throttle a port's top sources once its prediction passes this
+
+# per-operation deadlines (seconds); a call that misses its deadline is
+# abandoned, costing only the task that made it, never the control loop
+STATS_DEADLINE = 2.0
+METADATA_DEADLINE = 3.0
+FLOW_STATS_DEADLINE = 3.0
+FLOW_DEADLINE = 2.0
+GROUP_DEADLINE = 6.0     # group reads + bucket add/delete
+METER_DEADLINE = 8.0     # meter add + flow copies + old meter delete
+MODE_DEADLINE = 1.0
+NOTIFY_DEADLINE = 1.0
+
+MODE_REFRESH = 1.0       # seconds between dashboard mode lookups
+NOTIFY_BACKLOG = 100     # queued dashboard notifications before dropping
+IO_WORKERS = 8           # threads for blocking ONOS / dashboard calls
 
 # ==============================
 # STATE
@@ -21,119 +59,549 @@ CHECK_INTERVAL = 5
 prev_stats = {}
 ewma_state = {}
 rerouted = False
+mode = "baseline"        # cached by watch_mode(), never fetched per cycle
+port_meta = PortMetadataCache(ONOS_URL, AUTH, default_capacity_bps=LINK_CAPACITY_BPS)
+hot_ports = HotPortIndex()
+elephants = ElephantFlowMonitor(ONOS_URL, AUTH)
+hosts = HostLocations(ONOS_URL, AUTH, timeout=STATS_DEADLINE)
+paths = PathFinder(port_meta)    # next hops towards a destination, see paths.py
+balancer = MultipathBalancer(ONOS_URL, AUTH, timeout=FLOW_DEADLINE)
+meters = MeterManager(ONOS_URL, AUTH, timeout=FLOW_DEADLINE, hosts=hosts)
+
+# prediction transitions, reroutes + periodic summaries -> logs/module6.jsonl
+cycle_log = CycleLog("module6", initial_state="SAFE")
+
+# detection -> relief latency of every reroute; crossed_at holds when each
+# port's prediction last left SAFE
+tracer = TraceRecorder(ONOS_URL, AUTH, log=cycle_log)
+crossed_at = {}
+
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="reroute-io")
+actuation = None         # task currently relieving a port, if any
+meta_refresh = None      # in-flight port metadata reload, if any
+rebalancing = None       # in-flight group weight update, if any
+metering = None          # in-flight meter update / release, if any
+elephants_lock = asyncio.Lock()   # actuation and metering both re-sample `elephants`
+notifications = None     # asyncio.Queue of /api/reroute payloads, see main()
+
+# warm start: counters, EWMA and reroute bookkeeping -> state/module6.snap
+snapshots = Snapshotter("module6", lambda: {
+    "prev_stats": prev_stats,
+    "ewma_state": ewma_state,
+    "rerouted": rerouted,
+    "crossed_at": crossed_at,
+    # groups and meters change on I/O threads; copied under their locks
+    "groups": balancer.to_dicts(),
+    "meters": meters.to_dicts(),
+}, interval=2 * CHECK_INTERVAL)
+
+def restore_state():
+    global rerouted
+    snap = load_snapshot("module6", max_age=6 * CHECK_INTERVAL)
+    if snap:
+        prev_stats.update(snap["prev_stats"])
+        ewma_state.update(snap["ewma_state"])
+        crossed_at.update(snap["crossed_at"])
+        rerouted = snap["rerouted"]
+        for g in snap.get("groups", []):
+            balancer.groups[g["key"]] = MultipathGroup(g["key"], g["device"], g["group_id"],
+                                                       g["ports"], g["weights"])
+        for src, m in snap.get("meters", {}).items():
+            meters.meters[src] = Meter.from_dict(m)
+        print(f"[SNAPSHOT] Restored {len(prev_stats)} ports (rerouted={rerouted})")
 
 # ==============================
 # HELPERS
 # ==============================
+async def blocking(what, deadline, fn, *args, **kwargs):
+    """Run a blocking call on the I/O pool and wait at most `deadline` s.
+
+    The wait is abandoned, not the call: it keeps running on its worker
+    thread until its own requests finish or time out. For a single request
+    with the same timeout that is shortly after; a multi-request call such
+    as MeterManager.limit() can run for several timeouts more. Such calls
+    must tolerate being started again meanwhile (see MeterManager._claim).
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(io_pool, functools.partial(fn, *args, **kwargs)), deadline)
+    except asyncio.TimeoutError:
+        print(f"[DEADLINE] {what} missed its {deadline}s deadline")
+        raise
+
 def get_port_stats():
-    r = requests.get(f"{ONOS_URL}/statistics/ports", auth=AUTH)
-    return r.json().get("statistics", [])
+    # only device/port/bytesSent are decoded, see controller/utils/port_stats.py
+    return fetch_port_counters(ONOS_URL, AUTH, timeout=STATS_DEADLINE)
 
 def get_devices():
-    r = requests.get(f"{ONOS_URL}/devices", auth=AUTH)
+    r = requests.get(f"{ONOS_URL}/devices", auth=AUTH, timeout=STATS_DEADLINE)
     return r.json().get("devices", [])
 
-def install_flow(device_id, in_port, out_port):
+def get_mode():
+    r = requests.get(f"{DASHBOARD_URL}/api/mode", timeout=MODE_DEADLINE)
+    return r.json().get("mode", "baseline")
+
+def post_flow(device_id, flow):
+    return requests.post(f"{ONOS_URL}/flows/{device_id}", json=flow, auth=AUTH,
+                         timeout=FLOW_DEADLINE)
+
+def post_reroute_notice(payload):
+    requests.post(f"{DASHBOARD_URL}/api/reroute", json=payload, timeout=NOTIFY_DEADLINE)
+
+def notify_dashboard(payload):
+    """Queue a reroute notification; never waits on the dashboard."""
+    try:
+        notifications.put_nowait(payload)
+    except asyncio.QueueFull:
+        print("[NOTIFY] Dashboard backlog full; dropping reroute notification")
+
+def notify_reroute(device_id, trace, flows=(), in_port=None, out_ports=(), group_id=None):
+    """One notification per reroute action, listing every flow it moved, so
+    the dashboard starts a single post-reroute measurement window."""
+    notify_dashboard({"device": device_id, "in_port": in_port, "out_ports": list(out_ports),
+                      "group_id": group_id, "flows": list(flows),
+                      "trace_id": trace.id if trace is not None else None})
+
+async def install_flow(device_id, in_port, out_port, criteria=None, priority=40000, trace=None,
+                       group_id=None):
+    """Install a permanent flow sending traffic out of `out_port`, or to
+    the group `group_id` when given.
+
+    Matches everything arriving on `in_port`, or exactly `criteria` (ONOS
+    selector criteria, e.g. taken from an elephant flow) when given. With a
+    `trace`, the accepted flow is recorded and polled until it is ADDED.
+    """
+    if criteria is None:
+        criteria = [{"type": "IN_PORT", "port": str(in_port)}]
+    if group_id is not None:
+        instruction = {"type": "GROUP", "groupId": group_id}
+    else:
+        instruction = {"type": "OUTPUT", "port": str(out_port)}
     flow = {
-        "priority": 40000,
+        "priority": priority,
         "timeout": 0,
         "isPermanent": True,
         "deviceId": device_id,
         "treatment": {
-            "instructions": [
-                {"type": "OUTPUT", "port": str(out_port)}
-            ]
+            "instructions": [instruction]
         },
         "selector": {
-            "criteria": [
-                {"type": "IN_PORT", "port": str(in_port)}
-            ]
+            "criteria": criteria
         }
     }
 
-    r = requests.post(
-        f"{ONOS_URL}/flows/{device_id}",
-        json=flow,
-        auth=AUTH
-    )
+    try:
+        r = await blocking(f"flow install on {device_id}", FLOW_DEADLINE, post_flow, device_id, flow)
+    except Exception as e:
+        print("[ERROR] Flow install failed:", repr(e))
+        return False
 
     if r.status_code in [200, 201]:
         print(f"[FLOW] Installed flow on {device_id}")
-        # Notify dashboard that a reroute occurred so it can measure post-reroute throughput
-        try:
-            payload = {"device": device_id, "in_port": in_port, "out_port": out_port}
-            requests.post("http://127.0.0.1:5000/api/reroute", json=payload, timeout=1)
-        except Exception:
-            pass
-    else:
-        print("[ERROR] Flow install failed:", r.text)
+        if trace is not None:
+            # ONOS answers with Location: .../flows/{deviceId}/{flowId}
+            location = r.headers.get("Location", "")
+            tracer.flow_posted(trace, device_id, location.rstrip("/").rsplit("/", 1)[-1] or None)
+        return True
+    print("[ERROR] Flow install failed:", r.text)
+    return False
+
+
+def next_ports(device_id, target, exclude):
+    """Port numbers of `device_id`'s loop-free next hops towards the
+    switch `target` (see paths.py), other than `exclude`, shortest then
+    least utilized first."""
+    hops = paths.next_hops(device_id, target, exclude)
+    hops.sort(key=lambda h: (h[0], hot_ports.get(h[1])["util"] or 0.0))
+    return [key.rsplit(":", 1)[1] for _, key in hops]
+
+
+def in_port_key(device_id, flow):
+    in_port = criterion(flow["selector"].get("criteria", []), "IN_PORT")
+    return f"{device_id}:{in_port.get('port')}" if in_port else None
+
+
+def flow_alternates(device_id, congested_key, flow, host_table):
+    """Ports of `device_id`, other than `congested_key`, that still lead to
+    `flow`'s destination.
+
+    The flow's ingress port is never returned. [] when the destination is
+    unknown, attached to this device, or reachable only through
+    `congested_key`.
+    """
+    dst = hosts.destination(flow["selector"].get("criteria", []), host_table)
+    if dst is None:
+        return []
+    exclude = {congested_key, in_port_key(device_id, flow)}
+    return next_ports(device_id, dst[0], exclude)
+
+
+def port_loads(device_id, ports):
+    """{port key: (capacity_bps, predicted utilization)} for `ports`."""
+    loads = {}
+    for port in ports:
+        key = f"{device_id}:{port}"
+        loads[key] = (port_meta.capacity_bps(key), hot_ports.get(key)["pred"] or 0.0)
+    return loads
+
+
+async def balance_port(key, ewma, host_table, trace=None):
+    """Spread the heavy flows leaving `key` over it and its least utilized
+    alternates towards their destination through a SELECT group, weighted
+    so the hottest of those ports ends up as cool as possible. Returns
+    False when there is no real alternate, no heavy flow with a known
+    destination, or the group could not be installed."""
+    device_id, port_no = key.rsplit(":", 1)
+    # every bucket must lead to every flow in the group, so the group only
+    # takes the heavy flows towards the busiest destination switch
+    by_target = {}
+    for f in elephants.heavy_flows(key):
+        dst = hosts.destination(f["selector"].get("criteria", []), host_table)
+        if dst is not None:
+            by_target.setdefault(dst[0], []).append(f)
+    if not by_target:
+        return False
+    target, flows = max(by_target.items(), key=lambda t: sum(f["rate_bps"] for f in t[1]))
+    # no bucket may send a flow back out of the port it arrived on
+    exclude = {key} | {in_port_key(device_id, f) for f in flows}
+    alts = next_ports(device_id, target, exclude)[:MAX_PATHS - 1]
+    if not alts:
+        return False
+    ports = [port_no] + alts
+    loads = port_loads(device_id, ports)
+    capacity = [loads[f"{device_id}:{p}"][0] for p in ports]
+    background = [cap * pred for cap, pred in loads.values()]
+    demand = sum(f["rate_bps"] for f in flows)
+    # the flows being spread currently all leave through the congested port
+    background[0] = max(background[0] - demand, 0.0)
+    weights = solve_weights(capacity, background, demand)
+    try:
+        group = await blocking("group install", GROUP_DEADLINE, balancer.create, key, ports, weights)
+    except Exception:
+        group = None
+    if group is None:
+        return False
+    results = await asyncio.gather(*(
+        install_flow(device_id, None, None, criteria=f["selector"].get("criteria", []),
+                     priority=max(40000, f["priority"] + 1), trace=trace, group_id=group.group_id)
+        for f in flows
+    ))
+    moved = sum(results)
+    if moved:
+        notify_reroute(device_id, trace, [f["id"] for f, ok in zip(flows, results) if ok],
+                       out_ports=ports, group_id=group.group_id)
+        cycle_log.event("multipath", port=key, u_pred=round(ewma, 3), device=device_id,
+                        trace_id=trace.id if trace is not None else None,
+                        group=group.cookie, ports=ports, weights=weights, target=target, flows=moved,
+                        moved_bps=int(sum(f["rate_bps"] for f, ok in zip(flows, results) if ok)))
+    return moved > 0
+
+
+async def relieve_port(key, ewma, host_table, trace=None):
+    """Move the heaviest flows leaving `key`, each to its least utilized
+    other port towards its destination, just enough to bring the port's
+    predicted utilization down to RELIEF_TARGET. Flows with no other path
+    stay. Returns False when nothing could be moved."""
+    device_id = key.rsplit(":", 1)[0]
+    alternates = {f["id"]: flow_alternates(device_id, key, f, host_table)
+                  for f in elephants.heavy_flows(key)}
+    excess_bps = (ewma - RELIEF_TARGET) * port_meta.capacity_bps(key)
+    flows = elephants.flows_to_relieve(key, excess_bps, movable=lambda f: alternates[f["id"]])
+    if not flows:
+        return False
+    # one step above the matched rule so it takes precedence; all posted at once
+    out_ports = [alternates[f["id"]][0] for f in flows]
+    results = await asyncio.gather(*(
+        install_flow(device_id, None, out_port, criteria=f["selector"].get("criteria", []),
+                     priority=max(40000, f["priority"] + 1), trace=trace)
+        for f, out_port in zip(flows, out_ports)
+    ))
+    moved = sum(results)
+    if moved:
+        notify_reroute(device_id, trace, [f["id"] for f, ok in zip(flows, results) if ok],
+                       out_ports=sorted({p for p, ok in zip(out_ports, results) if ok}))
+        cycle_log.event("reroute", port=key, u_pred=round(ewma, 3), device=device_id,
+                        trace_id=trace.id if trace is not None else None,
+                        out_ports=sorted({p for p, ok in zip(out_ports, results) if ok}), flows=moved,
+                        moved_bps=int(sum(f["rate_bps"] for f, ok in zip(flows, results) if ok)),
+                        excess_bps=int(excess_bps))
+    return moved > 0
 
 # ==============================
-# MAIN LOGIC
+# TASKS
 # ==============================
-def check_and_reroute():
-    global rerouted
-    # Query dashboard to determine current mode; if backend unreachable,
-    # default to 'baseline' to avoid performing reroutes unexpectedly.
-    mode = "baseline"
+async def refresh_mode():
+    """Update the cached `mode`. If the dashboard is unreachable, fall back
+    to 'baseline' to avoid performing reroutes unexpectedly."""
+    global mode
     try:
-        resp = requests.get("http://127.0.0.1:5000/api/metrics", timeout=1)
-        mode = resp.json().get("mode", "baseline")
+        new_mode = await blocking("mode lookup", MODE_DEADLINE, get_mode)
     except Exception:
-        print("[MODE] Could not reach dashboard; assuming 'baseline' mode")
+        if mode != "baseline":
+            print("[MODE] Could not reach dashboard; assuming 'baseline' mode")
+        new_mode = "baseline"
+    if new_mode != mode:
+        print(f"[MODE] {mode} -> {new_mode}")
+        mode = new_mode
+
+
+async def watch_mode():
+    while True:
+        await asyncio.sleep(MODE_REFRESH)
+        await refresh_mode()
+
+
+async def send_notifications():
+    """Deliver queued /api/reroute notifications, one at a time."""
+    while True:
+        payload = await notifications.get()
+        try:
+            await blocking("dashboard notification", NOTIFY_DEADLINE, post_reroute_notice, payload)
+        except Exception:
+            pass
+
+
+async def refresh_metadata(port_keys):
+    """Reload port metadata if needed, waiting at most METADATA_DEADLINE.
+
+    A reload that takes longer keeps running and publishes its tables in
+    one assignment when done (PortMetadataCache.tables); meanwhile the
+    cycle keeps reading the previous, complete tables.
+    """
+    global meta_refresh
+    if meta_refresh is None or meta_refresh.done():
+        loop = asyncio.get_running_loop()
+        meta_refresh = loop.run_in_executor(io_pool, port_meta.refresh_if_changed, list(port_keys))
+    await asyncio.wait({meta_refresh}, timeout=METADATA_DEADLINE)
+
+
+async def rebalance_groups():
+    """Re-solve every multipath group's weights from this cycle's predictions."""
+    with balancer.lock:
+        groups = list(balancer.groups.values())
+    for group in groups:
+        loads = port_loads(group.device_id, group.ports)
+        try:
+            weights = await blocking("group rebalance", GROUP_DEADLINE, balancer.rebalance, group, loads)
+        except Exception as e:
+            print("[MULTIPATH] Rebalance failed:", repr(e))
+            continue
+        if weights:
+            print(f"[MULTIPATH] Group {group.cookie} weights -> {weights}")
+            cycle_log.event("rebalance", port=group.key, group=group.cookie,
+                            ports=group.ports, weights=weights)
+
+
+async def update_meters(over):
+    """Cap the top-talking sources of every port predicted above
+    METER_LIMIT, and release meters whose sources have calmed down."""
+    keep = set()
+    if over:
+        async with elephants_lock:
+            try:
+                await blocking("flow stats", FLOW_STATS_DEADLINE, elephants.update, [k for k, _ in over])
+            except Exception:
+                pass
+            heavy = {key: elephants.heavy_flows(key) for key, _ in over}
+        for key, pred in over:
+            flows = heavy[key]
+            # what the port's heavy flows may still send for it to reach METER_TARGET
+            allowed = sum(f["rate_bps"] for f in flows) - (pred - METER_TARGET) * port_meta.capacity_bps(key)
+            try:
+                rates = await blocking("host lookup", STATS_DEADLINE, meters.plan, flows, allowed)
+            except Exception:
+                continue
+            for source, rate in rates.items():
+                keep.add(source)
+                try:
+                    changed = await blocking("meter install", METER_DEADLINE, meters.limit, source, rate)
+                except Exception as e:
+                    print("[METER] Install failed:", repr(e))
+                    continue
+                if changed:
+                    print(f"[METER] {source} capped at {rate / 1e6:.1f} Mbps to relieve {key}")
+                    cycle_log.event("meter", port=key, source=source, rate_bps=int(rate),
+                                    u_pred=round(pred, 3))
+    if meters.meters:
+        try:
+            released = await blocking("meter sweep", METER_DEADLINE, meters.sweep, keep)
+        except Exception:
+            released = []
+        for source in released:
+            print(f"[METER] Released {source}")
+            cycle_log.event("meter_release", source=source)
+
+
+async def release_meters():
+    try:
+        await blocking("meter release", METER_DEADLINE, meters.release_all)
+    except Exception as e:
+        print("[METER] Release failed:", repr(e))
+
 
+async def actuate(key, ewma, hot_keys):
+    """Relieve the hottest port; runs beside the control loop."""
+    global rerouted
+    print("[ACTION] Predicted congestion → rerouting via flow update")
+
+    # prefer spreading the elephant flows on the hottest port over several
+    # paths, then moving just enough of them to one other port; fall back to
+    # moving the whole in-port when none can be identified
+    trace = tracer.start(key, detected_at=crossed_at.get(key))
+    async with elephants_lock:
+        try:
+            await blocking("flow stats", FLOW_STATS_DEADLINE, elephants.update, hot_keys)
+        except Exception:
+            pass
+        # flows are only moved towards ports that still reach their destination
+        try:
+            host_table = await blocking("host lookup", STATS_DEADLINE, hosts.table)
+        except Exception:
+            host_table = {}
+        if USE_MULTIPATH and key not in balancer.groups and await balance_port(key, ewma, host_table, trace):
+            moved = True
+        else:
+            moved = await relieve_port(key, ewma, host_table, trace)
+    if moved:
+        rerouted = True
+    else:
+        devices = port_meta.devices
+        if not devices:
+            try:
+                devices = [d["id"] for d in await blocking("device list", STATS_DEADLINE, get_devices)]
+            except Exception:
+                devices = []
+        if devices:
+            dpid = devices[0]
+            if await install_flow(dpid, 1, 2, trace=trace):  # example alternate port
+                notify_reroute(dpid, trace, in_port=1, out_ports=[2])
+                cycle_log.event("reroute", port=key, u_pred=round(ewma, 3), trace_id=trace.id,
+                                device=dpid, in_port=1, out_port=2)
+                rerouted = True
+    if "posted" not in trace.marks:
+        # nothing was installed; do not wait for relief
+        trace.info["failed"] = True
+        tracer.finish(trace)
+
+
+async def check_and_reroute():
+    global rerouted, actuation, rebalancing, metering
     # If not in proposed mode, ensure we do not reroute and reset state
     if mode != "proposed":
         if rerouted:
             print("[MODE] Switched out of proposed mode; clearing rerouted flag")
         rerouted = False
+        if meters.meters and (metering is None or metering.done()):
+            print("[MODE] Switched out of proposed mode; releasing meters")
+            metering = asyncio.create_task(release_meters())
+        return
+
+    try:
+        stats = await blocking("port statistics", STATS_DEADLINE, get_port_stats)
+    except Exception as e:
+        print("[STATS] Skipping cycle, port statistics unavailable:", repr(e))
         return
 
-    stats = get_port_stats()
+    cycle_log.begin_cycle()
     now = time.time()
+    await refresh_metadata(stats.keys)
 
-    for dev in stats:
-        device_id = dev["device"]
+    for key, bytes_tx in stats:
+        if key not in prev_stats:
+            prev_stats[key] = (bytes_tx, now)
+            ewma_state[key] = 0.0
+            continue
 
-        for p in dev["ports"]:
-            key = f'{device_id}:{p["port"]}'
-            bytes_tx = p["bytesSent"]
+        prev_bytes, prev_time = prev_stats[key]
+        dt = now - prev_time
+        if dt <= 0:
+            continue
 
-            if key not in prev_stats:
-                prev_stats[key] = (bytes_tx, now)
-                ewma_state[key] = 0.0
-                continue
+        rate = (bytes_tx - prev_bytes) * 8 / dt
+        util = rate / port_meta.capacity_bps(key)
 
-            prev_bytes, prev_time = prev_stats[key]
-            dt = now - prev_time
-            if dt <= 0:
-                continue
+        ewma = ALPHA * util + (1 - ALPHA) * ewma_state[key]
+        ewma_state[key] = ewma
+        prev_stats[key] = (bytes_tx, now)
 
-            rate = (bytes_tx - prev_bytes) * 8 / dt
-            util = rate / LINK_CAPACITY_BPS
+        state = "PREDICTED_CONGESTION" if ewma > PRED_THRESHOLD else "SAFE"
+        hot_ports.update(key, util=util, pred=ewma, state=state)
+        cycle_log.observe(key, state, u=util, u_pred=ewma)
+        if state == "SAFE":
+            crossed_at.pop(key, None)
+        else:
+            crossed_at.setdefault(key, now)
+        # first sample back under the threshold closes the port's trace
+        tracer.observe(key, util, PRED_THRESHOLD)
 
-            ewma = ALPHA * util + (1 - ALPHA) * ewma_state[key]
-            ewma_state[key] = ewma
-            prev_stats[key] = (bytes_tx, now)
+    # ports gone from the statistics must not drive reroutes
+    hot_ports.retain(stats.keys)
+    hot_ports.commit()
+    tracer.expire()
+
+    # keep existing multipath groups weighted for the new predictions
+    if balancer.groups and (rebalancing is None or rebalancing.done()):
+        rebalancing = asyncio.create_task(rebalance_groups())
 
-            print(f"[EWMA] {key} U={util:.2f} U_pred={ewma:.2f}")
+    # ports over the prediction threshold, hottest first; at most one
+    # actuation in flight, and the loop never waits for it
+    hot = hot_ports.above(PRED_THRESHOLD, metric="pred")
+    if hot and not rerouted and (actuation is None or actuation.done()):
+        key, ewma = hot[0]
+        actuation = asyncio.create_task(actuate(key, ewma, [k for k, _ in hot]))
 
-            if ewma > PRED_THRESHOLD and not rerouted:
-                print("[ACTION] Predicted congestion → rerouting via flow update")
+    # flood control, next to rerouting: throttle the sources of ports
+    # predicted beyond what rerouting can absorb
+    over = hot_ports.above(METER_LIMIT, metric="pred")
+    if (over or meters.meters) and (metering is None or metering.done()):
+        metering = asyncio.create_task(update_meters(over))
 
-                devices = get_devices()
-                if devices:
-                    dpid = devices[0]["id"]
-                    install_flow(dpid, 1, 2)  # example alternate port
-                    rerouted = True
+    tracer.drain()
+
+    cycle_log.end_cycle()
+
+
+async def control_loop():
+    next_tick = time.monotonic()
+    while True:
+        await check_and_reroute()
+        try:
+            snapshots.maybe_save()
+        except Exception as e:
+            # a failed snapshot only costs the warm start, never the loop
+            print("[SNAPSHOT] Save failed:", repr(e))
+        # fixed schedule: a slow cycle shortens the next sleep instead of
+        # pushing every later cycle back
+        next_tick = max(next_tick + CHECK_INTERVAL, time.monotonic())
+        await asyncio.sleep(next_tick - time.monotonic())
+
+
+async def main():
+    global notifications
+    notifications = asyncio.Queue(maxsize=NOTIFY_BACKLOG)
+    # turn SIGTERM (stop_system.sh) into a normal exit so the final snapshot is written
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    await refresh_mode()
+    workers = [asyncio.create_task(watch_mode()), asyncio.create_task(send_notifications())]
+    try:
+        await control_loop()
+    finally:
+        for task in workers:
+            task.cancel()
 
 # ==============================
 # LOOP
 # ==============================
 if __name__ == "__main__":
     print("=== Module 6: Predictive Flow Rerouting Started ===")
+    restore_state()
+    # `kill -USR2 <pid>` samples the live loop into logs/profile-module6-*
+    install_signal_trigger("module6")
 
-    while True:
-        check_and_reroute()
-        time.sleep(CHECK_INTERVAL)
-
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        snapshots.save_now()
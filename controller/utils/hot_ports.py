@@ -0,0 +1,151 @@
+"""
+Incrementally maintained index of port utilizations.
+
+Keeps every port's current and predicted utilization in sorted order, updated
+one port at a time as samples arrive, so the per-cycle questions
+
+- top-K ports by current or predicted utilization,
+- all ports at or above a threshold,
+- ports whose state changed since version V,
+
+are answered with a binary search instead of sorting or scanning all ports.
+
+Every method holds the index's lock, so request threads can share one index.
+A caller that applies a whole sample holds `lock` (re-entrant) around it, so
+other threads never see half of one.
+"""
+import bisect
+import functools
+import threading
+
+METRICS = ("util", "pred")
+
+CHANGE_LOG_LIMIT = 100_000  # state changes kept for changed_since()
+
+# sorts after any real port key, for strict "above" searches
+_MAX_KEY = "\U0010ffff"
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class HotPortIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = 0
+        self._values = {m: {} for m in METRICS}
+        self._sorted = {m: [] for m in METRICS}   # ascending (value, key)
+        self._extra = {}
+        self._state = {}
+        self._change_log = []                     # (version, key), ascending
+        self._pending_changes = []
+        self._log_floor = 0
+
+    def __len__(self):
+        return len(self._state)
+
+    # ------------------------------
+    # UPDATES
+    # ------------------------------
+    @_locked
+    def update(self, key, util=None, pred=None, state=None, **extra):
+        """Update one port; only the metrics that changed are re-positioned."""
+        for metric, value in (("util", util), ("pred", pred)):
+            if value is None:
+                continue
+            values = self._values[metric]
+            old = values.get(key)
+            if old == value:
+                continue
+            lst = self._sorted[metric]
+            if old is not None:
+                del lst[bisect.bisect_left(lst, (old, key))]
+            bisect.insort(lst, (value, key))
+            values[key] = value
+
+        if extra:
+            self._extra[key] = extra
+        if state is not None and self._state.get(key) != state:
+            self._state[key] = state
+            self._pending_changes.append(key)
+        elif key not in self._state:
+            self._state[key] = None
+
+    @_locked
+    def remove(self, key):
+        for metric in METRICS:
+            old = self._values[metric].pop(key, None)
+            if old is not None:
+                lst = self._sorted[metric]
+                del lst[bisect.bisect_left(lst, (old, key))]
+        self._extra.pop(key, None)
+        if self._state.pop(key, None) is not None:
+            self._pending_changes.append(key)
+
+    @_locked
+    def retain(self, keys):
+        """Remove every port not in `keys` (ports gone from the statistics)."""
+        keys = set(keys)
+        for key in [k for k in self._state if k not in keys]:
+            self.remove(key)
+
+    @_locked
+    def commit(self, version=None):
+        """Close the current sample and return its version.
+
+        `version` lets several indexes fed from the same samples (e.g. one
+        per dashboard worker) agree on version numbers; it must increase.
+        """
+        self.version = version if version is not None else self.version + 1
+        self._change_log.extend((self.version, key) for key in self._pending_changes)
+        self._pending_changes = []
+        if len(self._change_log) > CHANGE_LOG_LIMIT:
+            drop = len(self._change_log) // 2
+            self._log_floor = self._change_log[drop - 1][0]
+            del self._change_log[:drop]
+        return self.version
+
+    # ------------------------------
+    # QUERIES
+    # ------------------------------
+    @_locked
+    def top(self, k, metric="util"):
+        """[(key, value)] of the k highest ports, highest first."""
+        lst = self._sorted[metric]
+        return [(key, value) for value, key in reversed(lst[max(len(lst) - k, 0):])]
+
+    @_locked
+    def above(self, threshold, metric="util", inclusive=False):
+        """[(key, value)] of ports above `threshold`, highest first."""
+        lst = self._sorted[metric]
+        if inclusive:
+            i = bisect.bisect_left(lst, (threshold,))
+        else:
+            i = bisect.bisect_right(lst, (threshold, _MAX_KEY))
+        return [(key, value) for value, key in reversed(lst[i:])]
+
+    @_locked
+    def changed_since(self, version):
+        """{key: state} for ports whose state changed after `version`.
+
+        Returns every port's state when `version` is older than the retained
+        change log, so the caller can resynchronize.
+        """
+        if version < self._log_floor:
+            return dict(self._state)
+        i = bisect.bisect_right(self._change_log, (version, _MAX_KEY))
+        return {key: self._state.get(key) for _, key in self._change_log[i:]}
+
+    @_locked
+    def get(self, key):
+        """Everything known about one port."""
+        info = {"port": key, "state": self._state.get(key)}
+        for metric in METRICS:
+            info[metric] = self._values[metric].get(key)
+        info.update(self._extra.get(key, {}))
+        return info
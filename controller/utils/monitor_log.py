@@ -0,0 +1,159 @@
+"""
+Batched, rate-limited structured logging for the monitoring loops.
+
+The detection, prediction and reroute loops used to print one line per
+active port per cycle. `CycleLog` instead keeps the last state of every port,
+and per cycle only emits:
+
+- state transitions (e.g. NORMAL -> CONGESTED), at most one record per port
+  every `port_interval` seconds; suppressed transitions are counted into the
+  next record for that port,
+- one summary record every `summary_every` seconds,
+- explicit events (reroutes, errors) via `event()`.
+
+Records are JSON lines. They are handed to a background writer thread as one
+batch per cycle, so the loop never waits on disk; the writer rotates the file
+when it exceeds `max_bytes`.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "logs"))
+
+PORT_INTERVAL = 10.0      # min seconds between records for one port
+SUMMARY_EVERY = 30.0      # seconds between summary records
+MAX_BYTES = 5_000_000     # rotate the log file above this size
+BACKUPS = 3               # rotated files kept (<name>.1 .. <name>.N)
+QUEUE_SIZE = 1000         # pending batches before new ones are dropped
+
+
+class _Writer(threading.Thread):
+    def __init__(self, path, max_bytes, backups):
+        super().__init__(daemon=True, name=f"cyclelog:{os.path.basename(path)}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def submit(self, batch):
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            # never block the control loop on logging
+            self.dropped += len(batch)
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            self._fh.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in batch))
+            self._fh.flush()
+            if self._fh.tell() > self.max_bytes:
+                self._rotate()
+        self._fh.close()
+
+    def _rotate(self):
+        self._fh.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+
+class CycleLog:
+    def __init__(self, module, initial_state, path=None, port_interval=PORT_INTERVAL,
+                 summary_every=SUMMARY_EVERY, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.module = module
+        self.initial_state = initial_state
+        self.port_interval = port_interval
+        self.summary_every = summary_every
+
+        self._last_state = {}
+        self._last_logged = {}
+        self._suppressed = {}
+        self._pending = []
+        self._cycle_start = time.time()
+        self._last_summary = time.time()
+        self._cycles = 0
+        self._transitions = 0
+
+        self._writer = _Writer(path or os.path.join(LOG_DIR, f"{module}.jsonl"), max_bytes, backups)
+        self._writer.start()
+
+    def begin_cycle(self):
+        self._cycle_start = time.time()
+
+    def observe(self, key, state, **fields):
+        """Record this cycle's state for `key`; cheap when nothing changed."""
+        prev = self._last_state.get(key, self.initial_state)
+        if state == prev:
+            return
+        self._last_state[key] = state
+        self._transitions += 1
+        now = time.time()
+        if now - self._last_logged.get(key, 0.0) < self.port_interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return
+        self._last_logged[key] = now
+        rec = {"ts": round(now, 3), "mod": self.module, "ev": "transition",
+               "port": key, "from": prev, "to": state}
+        for k, v in fields.items():
+            rec[k] = round(v, 3) if isinstance(v, float) else v
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            rec["suppressed"] = suppressed
+        self._pending.append(rec)
+
+    def event(self, ev, **fields):
+        """Queue a one-off record (reroute, error, ...) with this cycle's batch."""
+        rec = {"ts": round(time.time(), 3), "mod": self.module, "ev": ev}
+        rec.update(fields)
+        self._pending.append(rec)
+
+    def end_cycle(self, **summary_fields):
+        """Hand this cycle's records to the writer and add a summary if due."""
+        now = time.time()
+        self._cycles += 1
+        # ports whose last transitions were rate limited: once their interval
+        # has passed, record where they ended up
+        for key in [k for k in self._suppressed if now - self._last_logged[k] >= self.port_interval]:
+            self._last_logged[key] = now
+            self._pending.append({"ts": round(now, 3), "mod": self.module, "ev": "transition",
+                                  "port": key, "to": self._last_state[key],
+                                  "suppressed": self._suppressed.pop(key)})
+        if now - self._last_summary >= self.summary_every:
+            counts = {}
+            for state in self._last_state.values():
+                counts[state] = counts.get(state, 0) + 1
+            rec = {"ts": round(now, 3), "mod": self.module, "ev": "summary",
+                   "cycles": self._cycles, "transitions": self._transitions,
+                   "ports": len(self._last_state), "states": counts,
+                   "cycle_ms": round((now - self._cycle_start) * 1000, 1)}
+            if self._writer.dropped:
+                rec["dropped"] = self._writer.dropped
+                self._writer.dropped = 0
+            rec.update(summary_fields)
+            self._pending.append(rec)
+            self._last_summary = now
+            self._cycles = 0
+            self._transitions = 0
+        if self._pending:
+            self._writer.submit(self._pending)
+            self._pending = []
+
+    def close(self):
+        self.end_cycle()
+        self._writer.queue.put(None)
+        self._writer.join(timeout=2)
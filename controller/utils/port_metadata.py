@@ -0,0 +1,265 @@
+"""
+Port metadata cache shared by the monitoring, routing and dashboard modules.
+
+Loads port speed, enabled state and the port-to-link mapping from ONOS
+(`/devices`, `/devices/{id}/ports`, `/links`) once, and reloads only when the
+topology changes:
+
+- the statistics reference a port we have not seen;
+- every CHECK_INTERVAL seconds, two cheap calls (`/devices`, `/links`) are
+  fingerprinted (device availability, links and their state); a link going
+  down or up, a disabled port (ONOS drops its link) or a device leaving
+  changes the fingerprint;
+- after MAX_AGE, for what the fingerprint cannot see (a port speed change).
+Callers normalize traffic with `capacity_bps(key)` instead of a global
+100 Mbps constant, and look links up by port key without re-fetching `/links`.
+
+Port keys use the same "<device>:<port>" form as the rest of the code base.
+"""
+import threading
+import time
+
+import requests
+
+# ==============================
+# DEFAULTS
+# ==============================
+ONOS_URL = "http://127.0.0.1:8181/onos/v1"
+AUTH = ("onos", "rocks")
+
+DEFAULT_CAPACITY_BPS = 100_000_000  # used when ONOS reports no port speed
+MAX_AGE = 300                       # seconds before a forced reload
+CHECK_INTERVAL = 5                  # seconds between /devices + /links fingerprints
+REQUEST_TIMEOUT = 2
+
+
+def port_key(device_id, port_no):
+    return f"{device_id}:{port_no}"
+
+
+def link_id(src_key, dst_key):
+    return f"{src_key}-{dst_key}"
+
+
+def fingerprint(devices, links):
+    """Hash of what /devices and /links say about the topology's shape."""
+    return hash((
+        frozenset((d.get("id"), d.get("available", True)) for d in devices),
+        frozenset((l.get("src", {}).get("device"), str(l.get("src", {}).get("port")),
+                   l.get("dst", {}).get("device"), str(l.get("dst", {}).get("port")),
+                   l.get("state", "ACTIVE")) for l in links),
+    ))
+
+
+class PortTables:
+    """One consistent set of port tables. Never modified once published:
+    a reload or a newly registered port builds a new instance, and the
+    cache swaps it in with a single assignment."""
+
+    __slots__ = ("devices", "device_ports", "index", "keys", "capacity", "enabled",
+                 "port_link", "links", "version", "loaded_at", "fingerprint")
+
+    def __init__(self, devices=(), device_ports=None, index=None, keys=(), capacity=(),
+                 enabled=(), port_link=None, links=(), version=0, loaded_at=0.0,
+                 fingerprint=None):
+        self.devices = devices
+        self.device_ports = device_ports or {}
+        self.index = index or {}
+        self.keys = keys
+        self.capacity = capacity
+        self.enabled = enabled
+        self.port_link = port_link or {}
+        self.links = links
+        self.version = version
+        self.loaded_at = loaded_at
+        self.fingerprint = fingerprint
+
+
+class PortMetadataCache:
+    """Precomputed capacity array and port-to-link index for all ports.
+
+    `index` maps a port key to its slot in the parallel `capacity` and
+    `enabled` lists, and `device_ports` lists each device's port keys.
+    `port_link` maps a port key to the id of the link it terminates, and
+    `links` keeps the link records in ONOS order.
+    `version` increments on every successful reload so consumers can cheaply
+    tell whether their derived views are stale.
+
+    All of them live in one PortTables object (`tables`) that is replaced,
+    never changed, so a reload running on another thread cannot hand a
+    reader a new index with old capacities. Readers that need several
+    tables at once take `tables` once and use that.
+    """
+
+    def __init__(self, onos_url=ONOS_URL, auth=AUTH,
+                 default_capacity_bps=DEFAULT_CAPACITY_BPS, max_age=MAX_AGE,
+                 timeout=REQUEST_TIMEOUT, check_interval=CHECK_INTERVAL):
+        self.onos_url = onos_url
+        self.auth = auth
+        self.default_capacity_bps = default_capacity_bps
+        self.max_age = max_age
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._checked_at = 0.0            # last /devices + /links fingerprint check
+        self.tables = PortTables()
+        self._publish = threading.Lock()   # serializes writers, never taken by readers
+
+    devices = property(lambda self: self.tables.devices)
+    device_ports = property(lambda self: self.tables.device_ports)
+    index = property(lambda self: self.tables.index)
+    keys = property(lambda self: self.tables.keys)
+    capacity = property(lambda self: self.tables.capacity)
+    enabled = property(lambda self: self.tables.enabled)
+    port_link = property(lambda self: self.tables.port_link)
+    links = property(lambda self: self.tables.links)
+    version = property(lambda self: self.tables.version)
+    loaded_at = property(lambda self: self.tables.loaded_at)
+
+    # ------------------------------
+    # LOADING
+    # ------------------------------
+    def _get(self, path):
+        r = requests.get(f"{self.onos_url}{path}", auth=self.auth, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def load(self):
+        """Fetch devices, ports and links from ONOS and rebuild the tables.
+
+        The new tables are built aside and swapped in at the end, so readers
+        never see a half-built index. On any ONOS error the previous tables
+        are kept and False is returned.
+        """
+        try:
+            device_list = self._get("/devices").get("devices", [])
+            devices = [d.get("id") for d in device_list]
+
+            index = {}
+            device_ports = {}
+            keys = []
+            capacity = []
+            enabled = []
+            for device_id in devices:
+                ports = self._get(f"/devices/{device_id}/ports").get("ports", [])
+                for p in ports:
+                    key = port_key(device_id, p.get("port"))
+                    if key in index:
+                        continue
+                    # ONOS reports portSpeed in Mbps; 0 or missing means unknown
+                    speed_mbps = p.get("portSpeed") or 0
+                    index[key] = len(keys)
+                    keys.append(key)
+                    device_ports.setdefault(device_id, []).append(key)
+                    capacity.append(speed_mbps * 1_000_000 if speed_mbps > 0
+                                    else self.default_capacity_bps)
+                    enabled.append(bool(p.get("isEnabled", True)))
+
+            links = []
+            port_link = {}
+            link_list = self._get("/links").get("links", [])
+            for l in link_list:
+                src = l.get("src", {})
+                dst = l.get("dst", {})
+                src_key = port_key(src.get("device"), src.get("port"))
+                dst_key = port_key(dst.get("device"), dst.get("port"))
+                lid = link_id(src_key, dst_key)
+                links.append({
+                    "id": lid,
+                    "from": src.get("device"),
+                    "to": dst.get("device"),
+                    "src_key": src_key,
+                    "dst_key": dst_key,
+                })
+                # a port is the source of at most one directed link
+                port_link[src_key] = lid
+                port_link.setdefault(dst_key, lid)
+        except Exception as e:
+            print("[PORTMETA] Reload failed, keeping previous tables:", e)
+            return False
+
+        with self._publish:
+            self.tables = PortTables(devices, device_ports, index, keys, capacity, enabled,
+                                     port_link, links, self.tables.version + 1, time.time(),
+                                     fingerprint(device_list, link_list))
+            self._checked_at = time.time()
+        return True
+
+    def _topology_changed(self, t):
+        """True when /devices + /links no longer match `t` (checked at most
+        every `check_interval` s; an ONOS error counts as unchanged)."""
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        try:
+            current = fingerprint(self._get("/devices").get("devices", []),
+                                  self._get("/links").get("links", []))
+        except Exception:
+            return False
+        return current != t.fingerprint
+
+    def refresh_if_changed(self, port_keys=()):
+        """Reload only if the tables are missing or too old, `port_keys`
+        contains a port the cache does not know about, or the devices or
+        links changed since the last load.
+
+        Ports that are still unknown after a reload (e.g. reported in the
+        statistics but not in `/ports`) are registered with the default
+        capacity so they do not trigger a reload on every cycle.
+        """
+        t = self.tables
+        unknown = [k for k in port_keys if k not in t.index]
+        stale = not t.loaded_at or time.time() - t.loaded_at > self.max_age
+        if not unknown and not stale and not self._topology_changed(t):
+            return False
+
+        reloaded = self.load()
+        self._register([key for key in unknown if key not in self.tables.index])
+        return reloaded
+
+    def invalidate(self):
+        with self._publish:
+            t = self.tables
+            self.tables = PortTables(t.devices, t.device_ports, t.index, t.keys, t.capacity,
+                                     t.enabled, t.port_link, t.links, t.version, 0.0,
+                                     t.fingerprint)
+
+    def _register(self, keys):
+        """Publish a copy of the tables with `keys` added at default capacity."""
+        if not keys:
+            return
+        with self._publish:
+            t = self.tables
+            device_ports = {d: list(ports) for d, ports in t.device_ports.items()}
+            index = dict(t.index)
+            key_list = list(t.keys)
+            for key in keys:
+                if key in index:
+                    continue
+                device_ports.setdefault(key.rsplit(":", 1)[0], []).append(key)
+                index[key] = len(key_list)
+                key_list.append(key)
+            added = len(key_list) - len(t.keys)
+            self.tables = PortTables(t.devices, device_ports, index, key_list,
+                                     list(t.capacity) + [self.default_capacity_bps] * added,
+                                     list(t.enabled) + [True] * added,
+                                     t.port_link, t.links, t.version, t.loaded_at,
+                                     t.fingerprint)
+
+    # ------------------------------
+    # LOOKUPS
+    # ------------------------------
+    def capacity_bps(self, key):
+        t = self.tables
+        slot = t.index.get(key)
+        if slot is None:
+            return self.default_capacity_bps
+        return t.capacity[slot]
+
+    def is_enabled(self, key):
+        t = self.tables
+        slot = t.index.get(key)
+        return True if slot is None else t.enabled[slot]
+
+    def link_for_port(self, key):
+        return self.tables.port_link.get(key)
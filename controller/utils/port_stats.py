@@ -0,0 +1,111 @@
+"""
+Streaming decoder for ONOS port statistics (`/statistics/ports`).
+
+Consumers only ever read `device`, `port` and `bytesSent`, so instead of
+building the whole document as Python objects (every counter of every port),
+the response is scanned chunk by chunk and only those three fields are
+extracted, straight into a `PortCounters` record of parallel arrays.
+
+The scanner relies on the field order ONOS writes: a statistics entry's
+`device` comes before its `ports`, and each port's `port` before its
+`bytesSent`. For a server that orders fields differently, set
+SDN_STATS_DECODER=json to parse the full document instead (with orjson when
+it is installed, the standard library json module otherwise).
+"""
+import os
+import re
+from array import array
+
+import requests
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+ONOS_URL = "http://127.0.0.1:8181/onos/v1"
+AUTH = ("onos", "rocks")
+
+DECODER = os.environ.get("SDN_STATS_DECODER", "scan")   # scan | json
+CHUNK_SIZE = 64 * 1024
+
+_FIELDS = re.compile(
+    rb'(?:"device"\s*:\s*"([^"]*)'
+    rb'|"port"\s*:\s*"?([^",}\s]*)'
+    rb'|"bytesSent"\s*:\s*(\d+))'
+)
+
+
+class PortCounters:
+    """`bytesSent` per port, as parallel `keys` / `bytes_sent` arrays.
+
+    Iterating yields ("<device>:<port>", bytes_sent) pairs in ONOS order.
+    """
+
+    __slots__ = ("keys", "bytes_sent")
+
+    def __init__(self):
+        self.keys = []
+        self.bytes_sent = array("q")
+
+    def append(self, key, bytes_sent):
+        self.keys.append(key)
+        self.bytes_sent.append(bytes_sent)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return zip(self.keys, self.bytes_sent)
+
+
+def scan_port_counters(chunks):
+    """Extract port counters from the raw JSON body, given as byte chunks.
+
+    Each chunk is scanned up to its last `,` or `}`, which always ends a
+    complete value; the remainder is carried over to the next chunk, so a
+    field split across chunks is never read half-way.
+    """
+    keys = []
+    counters = []
+    add_key, add_counter = keys.append, counters.append
+    prefix = port = None
+    tail = b""
+    for chunk in chunks:
+        buf = tail + chunk
+        cut = max(buf.rfind(b","), buf.rfind(b"}")) + 1
+        tail = buf[cut:]
+        for dev, p, nbytes in _FIELDS.findall(buf, 0, cut):
+            if nbytes:
+                if port is not None:
+                    add_key(prefix + port)
+                    add_counter(int(nbytes))
+                    port = None
+            elif dev:
+                prefix = dev.decode() + ":"
+            else:
+                port = p.decode()
+    out = PortCounters()
+    out.keys = keys
+    out.bytes_sent = array("q", counters)
+    return out
+
+
+def parse_port_counters(body):
+    """Same result from a full parse of the document (orjson or json)."""
+    out = PortCounters()
+    for d in _json.loads(body).get("statistics", []):
+        device_id = d.get("device")
+        for p in d.get("ports", []):
+            out.append(f"{device_id}:{p.get('port')}", p.get("bytesSent", 0))
+    return out
+
+
+def fetch_port_counters(onos_url=ONOS_URL, auth=AUTH, timeout=2):
+    """GET /statistics/ports and decode it with the configured decoder."""
+    with requests.get(f"{onos_url}/statistics/ports", auth=auth, timeout=timeout,
+                      stream=DECODER == "scan") as r:
+        r.raise_for_status()
+        if DECODER == "scan":
+            return scan_port_counters(r.iter_content(CHUNK_SIZE))
+        return parse_port_counters(r.content)
@@ -0,0 +1,153 @@
+"""
+Low-overhead sampling profiler for live processes.
+
+A background thread snapshots every thread's stack (`sys._current_frames()`)
+every few milliseconds; nothing is instrumented, so the profiled code runs
+at full speed between samples. Results come as
+
+- collapsed stacks ("thread;file:func;file:func count" per line), ready for
+  flamegraph.pl, speedscope or inferno;
+- a per-function summary of the hot path: samples spent in the function
+  itself (self) and anywhere below it (total).
+
+The dashboard serves this at `/debug/profile?seconds=N`; the controllers
+profile themselves on SIGUSR2 (`install_signal_trigger`) and write the
+result to `logs/`.
+"""
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+
+LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "logs"))
+
+INTERVAL = 0.005          # seconds between samples (200 Hz)
+MAX_SECONDS = 60          # longest profile accepted
+SIGNAL_SECONDS = float(os.environ.get("SDN_PROFILE_SECONDS", "10"))
+
+_busy = threading.Lock()  # one profile per process at a time
+
+# innermost Python frames of a thread that is parked, not working
+_IDLE = {
+    "threading.py:wait", "threading.py:_wait_for_tstate_lock", "queue.py:get",
+    "selectors.py:select", "socket.py:readinto", "socket.py:accept", "ssl.py:read",
+    "ssl.py:recv_into", "socketserver.py:serve_forever",
+}
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Profile:
+    def __init__(self, stacks, samples, duration, interval):
+        self.stacks = stacks        # Counter of stack tuples, root first
+        self.samples = samples      # sampling rounds taken
+        self.duration = duration
+        self.interval = interval
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed format, heaviest stacks first."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit=25):
+        """Hottest functions by self samples, with their total samples."""
+        self_counts = collections.Counter()
+        total_counts = collections.Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for name in set(stack[1:]):  # stack[0] is the thread
+                total_counts[name] += count
+        all_samples = sum(self.stacks.values()) or 1
+        return {
+            "duration_s": round(self.duration, 2),
+            "interval_ms": self.interval * 1000,
+            "rounds": self.samples,
+            "stack_samples": sum(self.stacks.values()),
+            "functions": [
+                {"function": name, "self": n, "total": total_counts[name],
+                 "self_pct": round(100 * n / all_samples, 1),
+                 "total_pct": round(100 * total_counts[name] / all_samples, 1)}
+                for name, n in self_counts.most_common(limit)
+            ],
+        }
+
+    def summary_text(self, limit=25):
+        s = self.summary(limit)
+        lines = [f"{s['stack_samples']} samples over {s['duration_s']} s "
+                 f"({s['rounds']} rounds at {s['interval_ms']:g} ms)",
+                 f"{'self%':>6} {'total%':>7}  function"]
+        for f in s["functions"]:
+            lines.append(f"{f['self_pct']:>6} {f['total_pct']:>7}  {f['function']}")
+        return "\n".join(lines) + "\n"
+
+
+def profile(seconds, interval=INTERVAL, idle=False):
+    """Sample all threads of this process for `seconds` and return a Profile.
+
+    Threads parked in a wait (lock, queue, select, socket read) are skipped
+    unless `idle`, so the output shows where time is spent working; a
+    `time.sleep` shows up at its caller. Raises ProfilerBusy if another
+    profile is running.
+    """
+    seconds = min(max(float(seconds), interval), MAX_SECONDS)
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks = collections.Counter()
+        rounds = 0
+        start = time.perf_counter()
+        end = start + seconds
+        while time.perf_counter() < end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                if not idle and stack and stack[0] in _IDLE:
+                    continue
+                stack.append(names.get(ident, str(ident)))
+                stacks[tuple(reversed(stack))] += 1
+            rounds += 1
+            time.sleep(interval)
+        return Profile(stacks, rounds, time.perf_counter() - start, interval)
+    finally:
+        _busy.release()
+
+
+def write_profile(name, prof, log_dir=LOG_DIR):
+    """Write `<name>-<time>.collapsed` and `.txt` to `log_dir`; returns the base path."""
+    os.makedirs(log_dir, exist_ok=True)
+    base = os.path.join(log_dir, f"profile-{name}-{time.strftime('%Y%m%dT%H%M%S')}")
+    with open(base + ".collapsed", "w") as fh:
+        fh.write(prof.collapsed())
+    with open(base + ".txt", "w") as fh:
+        fh.write(prof.summary_text())
+    return base
+
+
+def install_signal_trigger(name, sig=signal.SIGUSR2, seconds=SIGNAL_SECONDS):
+    """Profile the process for `seconds` whenever it receives `sig`
+    (`kill -USR2 <pid>`); results go to logs/profile-<name>-*."""
+    def run():
+        try:
+            base = write_profile(name, profile(seconds))
+            print(f"[PROFILE] Wrote {base}.collapsed and {base}.txt")
+        except ProfilerBusy:
+            print("[PROFILE] Already profiling; ignoring signal")
+
+    def handler(signum, frame):
+        print(f"[PROFILE] Sampling for {seconds:g} s")
+        threading.Thread(target=run, daemon=True, name="profiler").start()
+
+    signal.signal(sig, handler)
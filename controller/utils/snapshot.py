@@ -0,0 +1,95 @@
+"""
+Warm-start snapshots of controller and dashboard state.
+
+Each module periodically pickles its per-port counters, EWMA/predictor state
+and reroute bookkeeping into `state/<name>.snap` and restores it on startup,
+so a restart does not cost a cycle of initialization (or, for the dashboard,
+report the whole cumulative byte count as one throughput spike).
+
+Snapshots carry the time they were taken; on load anything older than
+`max_age` seconds is discarded, since counters that old would only produce
+misleading rates. Files are written atomically (temp file + rename) from a
+background thread, so a crash mid-write never leaves a corrupt snapshot and
+the control loop never waits on disk.
+"""
+import os
+import pickle
+import threading
+import time
+
+SNAPSHOT_DIR = os.environ.get(
+    "SDN_SNAPSHOT_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "state")),
+)
+SNAPSHOT_FORMAT = 1
+
+SAVE_INTERVAL = 10.0   # seconds between snapshots
+MAX_AGE = 60.0         # older snapshots are discarded on load
+
+
+def snapshot_path(name):
+    return os.path.join(SNAPSHOT_DIR, f"{name}.snap")
+
+
+def load_snapshot(name, max_age=MAX_AGE):
+    """Return the state saved under `name`, or None if missing, unreadable
+    or older than `max_age` seconds."""
+    try:
+        with open(snapshot_path(name), "rb") as fh:
+            snap = pickle.load(fh)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(snap, dict) or snap.get("format") != SNAPSHOT_FORMAT:
+        return None
+    age = time.time() - snap.get("saved_at", 0)
+    if age > max_age or age < 0:
+        print(f"[SNAPSHOT] Discarding {name} snapshot ({age:.0f}s old)")
+        return None
+    return snap["state"]
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+class Snapshotter:
+    """Saves `collect()` under `name` at most every `interval` seconds.
+
+    `collect` runs in the caller's thread, so it sees a consistent state;
+    only pickling's output is written in the background.
+    """
+
+    def __init__(self, name, collect, interval=SAVE_INTERVAL):
+        self.name = name
+        self.collect = collect
+        self.interval = interval
+        self._last = time.time()
+        self._writing = None
+
+    def maybe_save(self):
+        now = time.time()
+        if now - self._last < self.interval:
+            return False
+        if self._writing is not None and self._writing.is_alive():
+            return False  # previous write still in progress
+        self._last = now
+        data = pickle.dumps(
+            {"format": SNAPSHOT_FORMAT, "saved_at": now, "state": self.collect()},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        self._writing = threading.Thread(
+            target=_write, args=(snapshot_path(self.name), data), daemon=True
+        )
+        self._writing.start()
+        return True
+
+    def save_now(self):
+        """Synchronous save, e.g. on shutdown."""
+        _write(snapshot_path(self.name), pickle.dumps(
+            {"format": SNAPSHOT_FORMAT, "saved_at": time.time(), "state": self.collect()},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        ))
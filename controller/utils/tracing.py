@@ -0,0 +1,194 @@
+"""
+End-to-end latency tracing of reroutes, from detection to relief.
+
+Every reroute gets a trace id and timestamps for each stage of the control
+loop:
+
+    detected  port's predicted state first left SAFE
+    decided   the loop chose to act on it
+    posted    ONOS accepted the flow POST(s)
+    added     every installed flow reached state ADDED on the switch
+              (polled in a background thread)
+    relieved  first sample with the port back under the relief threshold
+
+Finished (or timed out) traces are published to the dashboard
+(`POST /api/traces`), which keeps per-stage histograms, once their flows
+have been confirmed.
+"""
+import collections
+import queue
+import threading
+import time
+import uuid
+
+import requests
+
+ONOS_URL = "http://127.0.0.1:8181/onos/v1"
+AUTH = ("onos", "rocks")
+DASHBOARD_URL = "http://127.0.0.1:5000"
+
+STAGES = ("detected", "decided", "posted", "added", "relieved")
+
+ADDED_POLL_INTERVAL = 0.2   # seconds between flow state polls
+ADDED_TIMEOUT = 10.0        # give up waiting for ADDED after this long
+RELIEF_TIMEOUT = 60.0       # publish without `relieved` after this long
+
+
+def stage_durations(marks):
+    """Per-stage durations in ms from a trace's stage timestamps.
+
+    `relief` is measured from `added` when known, otherwise from `posted`.
+    """
+    def span(a, b):
+        if marks.get(a) is None or marks.get(b) is None:
+            return None
+        return round((marks[b] - marks[a]) * 1000, 1)
+
+    return {
+        "decision": span("detected", "decided"),
+        "install": span("decided", "posted"),
+        "confirm": span("posted", "added"),
+        "relief": span("added", "relieved") if marks.get("added") else span("posted", "relieved"),
+        "total": span("detected", "relieved"),
+    }
+
+
+class RerouteTrace:
+    def __init__(self, port, detected_at=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.port = port
+        self.marks = {"detected": detected_at or time.time(), "decided": time.time()}
+        self.flows = []
+        self.pending_flows = 0
+        self.info = {}
+        self._lock = threading.Lock()
+
+    def mark(self, stage, t=None):
+        with self._lock:
+            if self.marks.get(stage) is None:
+                self.marks[stage] = t or time.time()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "port": self.port,
+            "marks": dict(self.marks),
+            "durations_ms": stage_durations(self.marks),
+            "flows": list(self.flows),
+            **self.info,
+        }
+
+
+class TraceRecorder:
+    """Tracks open reroute traces and publishes them when they finish.
+
+    ONOS polling and dashboard publishing run on one background thread, so
+    the control loop only ever enqueues work. Published records are also
+    handed back through `drain()` so the loop can log them itself.
+    """
+
+    def __init__(self, onos_url=ONOS_URL, auth=AUTH, dashboard_url=DASHBOARD_URL,
+                 relief_timeout=RELIEF_TIMEOUT, log=None):
+        self.onos_url = onos_url
+        self.auth = auth
+        self.dashboard_url = dashboard_url
+        self.relief_timeout = relief_timeout
+        self.log = log
+        self.open = {}                # port key -> RerouteTrace awaiting relief
+        self._queue = queue.Queue()
+        self._published = collections.deque(maxlen=1000)
+        threading.Thread(target=self._worker, daemon=True, name="trace-worker").start()
+
+    def start(self, port, detected_at=None):
+        trace = RerouteTrace(port, detected_at)
+        self.open[port] = trace
+        return trace
+
+    def flow_posted(self, trace, device_id, flow_id):
+        """Record an accepted flow POST and start polling it for ADDED."""
+        trace.mark("posted")
+        if flow_id is None:
+            return
+        with trace._lock:
+            trace.flows.append(flow_id)
+            trace.pending_flows += 1
+        self._queue.put(("poll", trace, device_id, flow_id, time.time()))
+
+    def observe(self, port, util_pred, threshold):
+        """Feed one sample for `port`; closes its trace once relieved."""
+        trace = self.open.get(port)
+        if trace is None:
+            return
+        if util_pred < threshold:
+            trace.mark("relieved")
+            self.finish(trace)
+
+    def expire(self):
+        """Publish traces that never saw relief within the timeout."""
+        now = time.time()
+        for trace in [t for t in self.open.values()
+                      if now - t.marks["decided"] > self.relief_timeout]:
+            trace.info["timed_out"] = True
+            self.finish(trace)
+
+    def finish(self, trace):
+        if self.open.get(trace.port) is trace:
+            del self.open[trace.port]
+        self._queue.put(("publish", trace))
+
+    def drain(self):
+        """Records published since the last call; logs them if a log is set."""
+        out = []
+        while self._published:
+            out.append(self._published.popleft())
+        if self.log is not None:
+            for record in out:
+                self.log.event("trace", **record)
+        return out
+
+    # ------------------------------
+    # BACKGROUND WORK
+    # ------------------------------
+    def _worker(self):
+        polls = []
+        finished = []
+        while True:
+            try:
+                item = self._queue.get(timeout=ADDED_POLL_INTERVAL if polls else None)
+                if item[0] == "poll":
+                    polls.append(item[1:])
+                else:
+                    finished.append(item[1])
+            except queue.Empty:
+                pass
+            polls = [p for p in polls if not self._poll(*p)]
+            # publish once every flow of the trace is confirmed or timed out
+            for trace in [t for t in finished if t.pending_flows == 0]:
+                finished.remove(trace)
+                self._publish(trace)
+
+    def _poll(self, trace, device_id, flow_id, since):
+        """Check one flow's state; True once it is finished with."""
+        try:
+            r = requests.get(f"{self.onos_url}/flows/{device_id}/{flow_id}",
+                             auth=self.auth, timeout=1)
+            flows = r.json().get("flows", [])
+            state = flows[0].get("state") if flows else None
+        except Exception:
+            state = None
+        if state != "ADDED" and time.time() - since < ADDED_TIMEOUT:
+            return False
+        with trace._lock:
+            trace.pending_flows -= 1
+            done = trace.pending_flows == 0
+        if state == "ADDED" and done:
+            trace.mark("added")
+        return True
+
+    def _publish(self, trace):
+        record = trace.to_dict()
+        self._published.append(record)
+        try:
+            requests.post(f"{self.dashboard_url}/api/traces", json=record, timeout=1)
+        except Exception:
+            pass
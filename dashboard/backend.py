@@ -1,84 +1,214 @@
 from flask import Flask, jsonify, render_template, request
 import os
+import sys
 from werkzeug.utils import secure_filename
 from datetime import datetime
+import signal
 import subprocess
 import requests
 import time
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from controller.utils.port_metadata import PortMetadataCache
+from controller.utils.port_stats import fetch_port_counters
+from controller.utils.hot_ports import HotPortIndex
+from controller.utils.snapshot import Snapshotter, load_snapshot
+from controller.utils.profiler import ProfilerBusy, profile
+from state_store import StateStore
+from history import MAX_POINTS as MAX_HISTORY_POINTS, SampleHistory
+from latency import stage_histograms
+from topology_view import TopologyLayout
+from response_cache import (MAX_VIEWS, ResponseCache, respond, respond_json, dumps, encode_topology,
+                            TOPOLOGY_BINARY_MIMETYPE)
+
 app = Flask(__name__)
 
 # ==============================
 # CONFIG
 # ==============================
-ONOS_URL = "http://127.0.0.1:8181/onos/v1"
+# SDN_ONOS_URL points the dashboard at another controller (or scripts/fake_onos.py)
+ONOS_URL = os.environ.get("SDN_ONOS_URL", "http://127.0.0.1:8181/onos/v1")
 AUTH = ("onos", "rocks")
 
 # ==============================
-# GLOBAL STATE
+# SHARED STATE
 # ==============================
-traffic_process = None
-SYSTEM_MODE = "baseline"   # baseline | proposed
+# Everything mutable lives in the shared state store so every WSGI worker
+# process/thread serves the same mode, samples and reroute measurements.
+# Keys:
+#   mode               baseline | proposed
+#   sampler            prev_ewma, prev_bytes, prev_time, prev_port_bytes
+#   sample             last published /api/metrics payload (+ sampled_at)
+#   port_utils         current per-port {util, rate_bps, pred}, as measured;
+#                      every worker's hot-port index is built from it
+#   port_boost         demo-only {port: util} shown in the topology instead
+#   reroute            event_time, measuring, samples (post-reroute throughput)
+#   rerouted_links     link ids highlighted in the topology
+#   congestion_active  demo congestion flag
+#   traffic_pid        pid of the iperf client started by /api/start-traffic
+#   traces             last MAX_TRACES reroute latency traces from the rerouter
+shared = StateStore()
+
+# every published sample, for /api/history (same database file as `shared`)
+history = SampleHistory(shared.path)
+
+# per-port current/predicted utilization in sorted order (per process; the
+# sampler updates it directly, other workers catch up from `port_utils`)
+hot_ports = HotPortIndex()
+hot_ports_synced = None
+
+# per-port thresholds used for port states in the hot-port index
+PORT_CONGESTED = 0.8
+PORT_PRED_THRESHOLD = 0.75
+
+# rendered /api/metrics and /api/topology bodies, one per data version
+responses = ResponseCache()
+# folded topology views, one per (depth, expand) key; bounded separately
+topology_views = ResponseCache(max_entries=MAX_VIEWS)
+# downsampled /api/history bodies, one per (points, range, method, series)
+history_views = ResponseCache(max_entries=MAX_VIEWS)
+
+# server-side topology layout (per process; deterministic, so every worker
+# places the nodes identically)
+layout = None
 
 ALPHA = 0.6
-prev_ewma = 0.0
-prev_bytes = 0
-prev_time = time.time()
-
-# store previous per-port cumulative bytes
-prev_port_bytes = {}
 
-# current port utilization data for topology
-current_port_utilizations = {}
+# A published sample is served to every client for SAMPLE_INTERVAL seconds;
+# one worker at a time holds the sampler lease and refreshes it from ONOS.
+# The lease outlasts one sample's ONOS calls (2 s counters + 2 s flow count
+# + a metadata reload); sample_metrics renews it once those calls are done
+# and publishes nothing if another worker took it over meanwhile.
+SAMPLE_INTERVAL = 1.0
+SAMPLER_LEASE = 10.0
 
-# Reroute measurement state: when a reroute happens the rerouter will POST
+# Reroute measurement: when a reroute happens the rerouter will POST
 # to /api/reroute and we will measure real throughput for a short window
 # to report `throughput_proposed` as the measured value instead of a model.
-reroute_event_time = None
-measuring_reroute = False
 reroute_measure_window = 6.0  # seconds to sample after a reroute
-proposed_samples = []
 
-# track rerouted links for topology visualization
-rerouted_links = set()
-LINK_CAPACITY_BPS = 100_000_000
+MAX_TRACES = 500  # reroute latency traces kept for /api/traces
+
+LINK_CAPACITY_BPS = 100_000_000  # fallback when ONOS reports no port speed
+
+# port speeds, enabled state and port->link index, loaded once from ONOS
+port_meta = PortMetadataCache(ONOS_URL, AUTH, default_capacity_bps=LINK_CAPACITY_BPS)
+
+
+def new_sampler():
+    # prev_bytes/prev_time of None mark the first sample, which only records
+    # the counters instead of reporting them as one huge throughput spike
+    return {"prev_ewma": 0.0, "prev_bytes": None, "prev_time": None,
+            "prev_port_bytes": {}, "port_ewma": {}}
+
+
+def reset_state():
+    """Start from a clean slate (called once per server start, not per worker).
+
+    Sampler counters, reroute measurement and reroute annotations are
+    restored from the warm-start snapshot when it is recent enough.
+    """
+    shared.clear()
+    history.clear()
+    state = {
+        "mode": "baseline",
+        "sampler": new_sampler(),
+        "reroute": {"event_time": None, "measuring": False, "samples": []},
+        "rerouted_links": [],
+        "congestion_active": False,
+        "traces": [],
+    }
+    snap = load_snapshot("dashboard")
+    if snap:
+        state.update(snap)
+        print(f"[SNAPSHOT] Restored sampler state for {len(snap['sampler']['prev_port_bytes'])} ports")
+    shared.set_many(state)
+
+
+# warm start: written by whichever worker currently holds the sampler lease
+snapshots = Snapshotter("dashboard", lambda: shared.get_many("sampler", "reroute", "rerouted_links"))
 
-# track congestion state for demonstration
-congestion_active = False
 
 # ==============================
 # METRICS
 # ==============================
 def get_live_metrics():
-    global prev_ewma, prev_bytes, prev_time
-    global prev_port_bytes
-    global congestion_active, SYSTEM_MODE, current_port_utilizations
+    """Return the latest sample, refreshing it at most once per interval.
 
-    r = requests.get(f"{ONOS_URL}/statistics/ports", auth=AUTH, timeout=2)
-    stats = r.json().get("statistics", [])
+    Workers that find the sample stale race for the sampler lease; the
+    winner queries ONOS and publishes, the rest keep serving the previous
+    sample instead of queueing behind it.
+    """
+    sample = shared.get("sample")
+    deadline = time.time() + SAMPLER_LEASE
+    while sample is None or time.time() - sample["sampled_at"] >= SAMPLE_INTERVAL:
+        if shared.try_acquire("sampler", SAMPLER_LEASE):
+            try:
+                sample = sample_metrics() or shared.get("sample")
+            finally:
+                shared.release("sampler")
+            break
+        if sample is not None or time.time() > deadline:
+            break
+        # nothing published yet: wait for the worker that is sampling
+        time.sleep(0.05)
+        sample = shared.get("sample")
+
+    if sample is None:
+        raise RuntimeError("no metrics sample available")
+    # mode can change between samples; always report the current one
+    sample = dict(sample)
+    sample["mode"] = shared.get("mode", "baseline")
+    return sample
+
+
+def sample_metrics():
+    """Query ONOS, compute one metrics sample and publish it to the store.
+
+    Only called by the holder of the sampler lease, so the sampler counters
+    are read and written by a single worker at a time. Returns None without
+    publishing when the lease was lost during the ONOS calls.
+    """
+    st = shared.get_many("mode", "sampler", defaults={
+        "mode": "baseline",
+        "sampler": new_sampler(),
+    })
+    SYSTEM_MODE = st["mode"]
+    sampler = st["sampler"]
+    prev_ewma = sampler["prev_ewma"]
+    prev_bytes = sampler["prev_bytes"]
+    prev_time = sampler["prev_time"]
+    prev_port_bytes = sampler["prev_port_bytes"]
+    port_ewma = sampler.get("port_ewma", {})
+    seq = sampler.get("seq", 0) + 1
+
+    # only device/port/bytesSent are decoded, see controller/utils/port_stats.py
+    stats = fetch_port_counters(ONOS_URL, AUTH, timeout=2)
+    port_meta.refresh_if_changed(stats.keys)
+    # include flows and top_ports for frontend charts
+    flows = get_flow_count()
+    # all ONOS calls are done; a slow one may have cost us the lease, and the
+    # counters read above are then already someone else's to advance
+    if not shared.renew("sampler", SAMPLER_LEASE):
+        print("[SAMPLER] Lease lost during ONOS calls; dropping this sample")
+        return None
 
-    total_bytes = 0
+    total_bytes = sum(stats.bytes_sent)
     port_utilizations = {}
-    for device in stats:
-        device_id = device.get("device")
-        for p in device.get("ports", []):
-            bytes_sent = p.get("bytesSent", 0)
-            total_bytes += bytes_sent
-
-            # per-port key
-            port_no = p.get("port")
-            key = f"{device_id}:{port_no}"
-            prev_b = prev_port_bytes.get(key, 0)
-            # delta since last sample (may be zero on first call)
-            delta_b = max(bytes_sent - prev_b, 0)
-            # store current cumulative for next interval
-            prev_port_bytes[key] = bytes_sent
-
-            # will compute utilization after delta_time known
-            port_utilizations[key] = delta_b
+    for key, bytes_sent in stats:
+        prev_b = prev_port_bytes.get(key, bytes_sent)
+        # delta since last sample (zero the first time a port is seen)
+        delta_b = max(bytes_sent - prev_b, 0)
+        # store current cumulative for next interval
+        prev_port_bytes[key] = bytes_sent
+
+        # will compute utilization after delta_time known
+        port_utilizations[key] = delta_b
 
     # ---- REAL THROUGHPUT (RATE, NOT CUMULATIVE) ----
     now = time.time()
+    if prev_bytes is None:
+        prev_bytes, prev_time = total_bytes, now - 1
     delta_time = max(now - prev_time, 1)
     delta_bytes = total_bytes - prev_bytes
 
@@ -87,19 +217,31 @@ def get_live_metrics():
     prev_bytes = total_bytes
     prev_time = now
 
-    # compute per-port utilization (fraction)
-    per_port_util = []
+    # compute per-port utilization (fraction) and its EWMA prediction, and
+    # feed both into the hot-port index
+    current_port_utilizations = {}
     for key, delta_b in port_utilizations.items():
         rate_bps = (delta_b * 8) / max(delta_time, 1)
-        util = rate_bps / LINK_CAPACITY_BPS
-        per_port_util.append((key, util, rate_bps))
-
-    # store current port utilizations for topology (store both fraction and rate)
-    current_port_utilizations = {key: {"util": util, "rate_bps": rate_bps} for key, util, rate_bps in per_port_util}
-
-    # top-5 ports by utilization
-    per_port_util.sort(key=lambda x: x[1], reverse=True)
-    top_ports = [ {"port": p[0], "utilization": round(p[1], 3), "rate_bps": int(p[2])} for p in per_port_util[:5] ]
+        util = rate_bps / port_meta.capacity_bps(key)
+        pred = ALPHA * util + (1 - ALPHA) * port_ewma.get(key, 0.0)
+        port_ewma[key] = pred
+        # store current port utilizations for topology (fraction, rate and prediction)
+        current_port_utilizations[key] = {"util": util, "rate_bps": rate_bps, "pred": pred}
+    # ports that left the statistics are dropped from the index
+    with hot_ports.lock:
+        for key, info in current_port_utilizations.items():
+            hot_ports.update(key, util=info["util"], pred=info["pred"],
+                             state=port_state(info["util"], info["pred"]), rate_bps=info["rate_bps"])
+        hot_ports.retain(current_port_utilizations)
+        hot_ports.commit(seq)
+        hottest = hot_ports.top(5)
+
+    # top-5 ports by utilization, straight from the index
+    top_ports = [
+        {"port": key, "utilization": round(util, 3),
+         "rate_bps": int(current_port_utilizations.get(key, {}).get("rate_bps", 0))}
+        for key, util in hottest
+    ]
 
     # ---- UTILIZATION ----
     # compute utilization as fraction of assumed link capacity
@@ -107,7 +249,6 @@ def get_live_metrics():
 
     # ---- EWMA ----
     ewma = ALPHA * utilization + (1 - ALPHA) * prev_ewma
-    prev_ewma = ewma
 
     # expose EWMA as percent for clearer charting
     ewma_percent = ewma * 100.0
@@ -139,15 +280,22 @@ def get_live_metrics():
     # If a reroute measurement is active, accumulate samples and compute
     # the proposed throughput from measured samples. Otherwise default to
     # the current measured throughput.
-    global reroute_event_time, measuring_reroute, proposed_samples
-    now_time = time.time()
-    if measuring_reroute:
-        # still within measurement window
-        if now_time - (reroute_event_time or 0) <= reroute_measure_window:
-            proposed_samples.append(throughput)
-        else:
-            # measurement window finished
-            measuring_reroute = False
+    def record_reroute_sample(rr):
+        now_time = time.time()
+        if rr["measuring"]:
+            # still within measurement window
+            if now_time - (rr["event_time"] or 0) <= reroute_measure_window:
+                rr["samples"].append(throughput)
+            else:
+                # measurement window finished
+                rr["measuring"] = False
+        return rr
+
+    rr = shared.update("reroute", record_reroute_sample,
+                       default={"event_time": None, "measuring": False, "samples": []})
+    reroute_event_time = rr["event_time"]
+    measuring_reroute = rr["measuring"]
+    proposed_samples = rr["samples"]
     if proposed_samples:
         # use average of samples measured after reroute
         throughput_proposed = sum(proposed_samples) / len(proposed_samples)
@@ -155,6 +303,9 @@ def get_live_metrics():
         throughput_proposed = throughput
 
     # ---- DEMO VISUALIZATION BOOST ----
+    # kept apart from port_utils: only get_topology() shows it, the hot-port
+    # indexes (and /api/top-ports) stay on measured values in every worker
+    port_boost = {}
     # For demo purposes: when congestion is active and the UI is in proposed
     # mode, synthesize a visible improvement so the dashboard shows a clear
     # difference between baseline and proposed. This does NOT change
@@ -165,17 +316,14 @@ def get_live_metrics():
             boost = max(throughput * 0.2, 2.0)
             throughput_proposed = round(min(throughput + boost, LINK_CAPACITY_BPS / 1e6), 2)
             # also make the top few ports show increased utilization for the UI
-            # pick up to 3 ports from per_port_util and increase their util
-            for i, (key, util, rate_bps) in enumerate(per_port_util[:3]):
+            # pick up to 3 of the hottest ports and increase their util
+            for key, util in hot_ports.top(3):
                 # increase utilization by 0.2 (20%) but cap at 0.95
-                current_port_utilizations[key] = min(0.95, max(util, util + 0.2))
+                port_boost[key] = min(0.95, max(util, util + 0.2))
     except Exception:
         pass
 
-    # include flows and top_ports for frontend charts
-    flows = get_flow_count()
-
-    return {
+    sample = {
         "throughput": round(throughput, 2),
         "throughput_baseline": round(throughput_baseline, 2),
         "throughput_proposed": round(throughput_proposed, 2),
@@ -191,9 +339,59 @@ def get_live_metrics():
         "state": state,
         "mode": SYSTEM_MODE,
         "flows": flows,
-        "top_ports": top_ports
+        "top_ports": top_ports,
+        "sampled_at": now,
+        "seq": seq
     }
 
+    shared.set_many({
+        "sampler": {"prev_ewma": ewma, "prev_bytes": prev_bytes, "prev_time": prev_time,
+                    "prev_port_bytes": prev_port_bytes, "port_ewma": port_ewma, "seq": seq},
+        "port_utils": current_port_utilizations,
+        "port_boost": port_boost,
+        "congestion_active": congestion_active,
+        "sample": sample,
+    })
+    history.append(sample)
+    snapshots.maybe_save()
+    return sample
+
+
+def port_state(util, pred):
+    if util > PORT_CONGESTED:
+        return "CONGESTED"
+    if pred > PORT_PRED_THRESHOLD:
+        return "PREDICTED_CONGESTION"
+    return "SAFE"
+
+
+def sync_hot_ports():
+    """Bring this worker's hot-port index up to the last published sample.
+
+    Only ports whose values changed are re-positioned in the index.
+    """
+    global hot_ports_synced
+    version = shared.version("port_utils")
+    if version == hot_ports_synced:
+        return
+    st = shared.get_many("port_utils", "sample", defaults={"port_utils": {}})
+    port_utils = st["port_utils"]
+    seq = (st["sample"] or {}).get("seq", 0)
+    with hot_ports.lock:
+        if seq <= hot_ports.version:
+            # this worker published the sample itself (or another request
+            # thread already applied it)
+            hot_ports_synced = version
+            return
+        for key, info in port_utils.items():
+            util = info.get("util", 0.0)
+            pred = info.get("pred", util)
+            hot_ports.update(key, util=util, pred=pred, state=port_state(util, pred),
+                             rate_bps=info.get("rate_bps", 0))
+        hot_ports.retain(port_utils)
+        hot_ports.commit(seq)
+    hot_ports_synced = version
+
 
 def get_topology():
     """Return nodes and links with utilization and congested flags."""
@@ -202,7 +400,14 @@ def get_topology():
     # For demo: if congestion_active is set and no reroutes recorded, synthesize
     # a small set of rerouted link IDs so the frontend can highlight them.
     # This does not change controller state; it's purely for visualization.
-    global rerouted_links, congestion_active, SYSTEM_MODE
+    st = shared.get_many("mode", "congestion_active", "rerouted_links", "port_utils", "port_boost",
+                         defaults={"mode": "baseline", "rerouted_links": [], "port_utils": {},
+                                   "port_boost": {}})
+    SYSTEM_MODE = st["mode"]
+    congestion_active = bool(st["congestion_active"])
+    rerouted_links = set(st["rerouted_links"])
+    current_port_utilizations = st["port_utils"]
+    port_boost = st["port_boost"]
     # only synthesize demo reroutes while in proposed mode
     if congestion_active and not rerouted_links and SYSTEM_MODE == 'proposed':
         # pick common link ids observed in the topology for this testbed
@@ -212,30 +417,24 @@ def get_topology():
             "of:0000000000000003:4-of:0000000000000002:1"
         }
         rerouted_links.update(demo_reroutes)
+        shared.set("rerouted_links", sorted(rerouted_links))
     
     try:
-        # devices
-        r = requests.get(f"{ONOS_URL}/devices", auth=AUTH, timeout=2)
-        devs = r.json().get('devices', []) if isinstance(r.json(), dict) else []
-        for d in devs:
-            nodes.append({"id": d.get('id'), "label": d.get('id')})
-        
-        # links
-        r = requests.get(f"{ONOS_URL}/links", auth=AUTH, timeout=2)
-        link_data = r.json().get('links', []) if isinstance(r.json(), dict) else []
-        for i, l in enumerate(link_data):
-            src = l.get('src', {})
-            dst = l.get('dst', {})
-            link_id = f"{src.get('device')}:{src.get('port')}-{dst.get('device')}:{dst.get('port')}"
-            
-            # get utilization from port statistics
-            src_port_key = f"{src.get('device')}:{src.get('port')}"
-            dst_port_key = f"{dst.get('device')}:{dst.get('port')}"
+        # devices and links come from the port metadata cache; the route
+        # refreshed it (only on topology changes) before picking its version
+        tables = port_meta.tables  # devices and links from the same load
+        for device_id in tables.devices:
+            nodes.append({"id": device_id, "label": device_id})
+
+        for l in tables.links:
+            link_id = l["id"]
+            src_port_key = l["src_key"]
+            dst_port_key = l["dst_key"]
             # current_port_utilizations stores objects with util and rate_bps
             src_info = current_port_utilizations.get(src_port_key, {"util": 0.0, "rate_bps": 0})
             dst_info = current_port_utilizations.get(dst_port_key, {"util": 0.0, "rate_bps": 0})
-            src_util = src_info.get("util", 0.0)
-            dst_util = dst_info.get("util", 0.0)
+            src_util = port_boost.get(src_port_key, src_info.get("util", 0.0))
+            dst_util = port_boost.get(dst_port_key, dst_info.get("util", 0.0))
             link_utilization = max(src_util, dst_util)  # use max of both ports
             # estimate link rate in Mbps for clearer UI display
             src_rate_mbps = src_info.get("rate_bps", 0) / 1e6
@@ -244,8 +443,8 @@ def get_topology():
             
             links.append({
                 "id": link_id,
-                "from": src.get('device'),
-                "to": dst.get('device'),
+                "from": l["from"],
+                "to": l["to"],
                 "utilization": link_utilization,
                 "rate_mbps": round(link_rate_mbps, 3),
                 "congested": link_utilization > 0.8 or (congestion_active and link_id in [
@@ -265,15 +464,49 @@ def get_topology():
     return {"nodes": nodes, "links": links, "rerouted_links": exported_reroutes}
 
 
+def topology_layout():
+    """Tree layout of the current ONOS topology, rebuilt when it changes."""
+    global layout
+    tables = port_meta.tables
+    if layout is None or layout.version != tables.version:
+        layout = TopologyLayout(tables.devices, tables.links, tables.version)
+    return layout
+
+
 @app.route('/api/topology')
 def topology():
-    return jsonify(get_topology())
+    """Topology with per-link utilization and a stable server-side layout.
+
+    The body is rendered once per version of its inputs (sample, mode, demo
+    flags, ONOS topology) and served with an ETag. `?format=bin` returns
+    the compact binary encoding from response_cache.encode_topology.
+
+    `?depth=N` folds every subtree below tree level N into a cluster node,
+    and `expand=a,b` opens the listed clusters (see topology_view.py). The
+    folded views are JSON only.
+    """
+    port_meta.refresh_if_changed()
+    version = (shared.version("port_utils", "port_boost", "mode", "congestion_active", "rerouted_links"),
+               port_meta.version)
+    depth = request.args.get("depth", type=int)
+    expand = [e for e in request.args.get("expand", "").split(",") if e]
+    if depth is not None or expand:
+        tree = topology_layout()
+        key = tree.view_key(depth if depth is not None else 1, expand)
+        cached = topology_views.get(f"topology:{key}", version, lambda: dumps(tree.view(get_topology(), *key)))
+    elif request.args.get("format") == "bin":
+        cached = responses.get("topology.bin", version, lambda: encode_topology(get_topology()),
+                               mimetype=TOPOLOGY_BINARY_MIMETYPE)
+    else:
+        cached = responses.get("topology", version,
+                               lambda: dumps(topology_layout().place(get_topology())))
+    return respond(cached)
 
 
 @app.route('/api/traffic-status')
 def traffic_status():
     # Return whether the backend has started a traffic process
-    return jsonify({"running": traffic_process is not None})
+    return jsonify({"running": shared.get("traffic_pid") is not None})
 
 
 def get_flow_count():
@@ -308,20 +541,94 @@ def dashboard():
 
 @app.route("/api/metrics")
 def metrics():
-    return jsonify(get_live_metrics())
+    sample = get_live_metrics()
+    # one encoding per published sample (and mode), shared by all pollers
+    cached = responses.get("metrics", (sample["sampled_at"], sample["mode"]), lambda: dumps(sample))
+    return respond(cached)
+
+@app.route("/api/top-ports")
+def top_ports():
+    """Hottest ports from the hot-port index.
+
+    `k` (default 5) and `metric` (util | pred) select the top-K view;
+    `above=X` returns every port above X instead; `since=V` adds the ports
+    whose state changed after index version V.
+    """
+    metric = request.args.get("metric", "util")
+    if metric not in ("util", "pred"):
+        return jsonify({"error": "metric must be util or pred"}), 400
+    try:
+        k = int(request.args.get("k", 5))
+        above = request.args.get("above", type=float)
+        since = request.args.get("since", type=int)
+    except ValueError:
+        return jsonify({"error": "invalid k"}), 400
+
+    sync_hot_ports()
+    hits = hot_ports.above(above, metric) if above is not None else hot_ports.top(k, metric)
+    out = {
+        "version": hot_ports.version,
+        "metric": metric,
+        "ports": [hot_ports.get(key) for key, _ in hits],
+    }
+    if since is not None:
+        out["changed"] = hot_ports.changed_since(since)
+    return jsonify(out)
+
+@app.route("/api/history")
+def chart_history():
+    """Chart series for the whole run, the last `window` seconds of it, or
+    `start`..`end` (epoch seconds), downsampled to at most `points` rows
+    with LTTB (default) or min/max.
+
+    Downsampling a long run costs up to a second of CPU, so each body is
+    cached and reused until one more output bucket of samples (range /
+    points) has arrived; a range that ended in the past never changes.
+    """
+    try:
+        points = max(3, min(int(request.args.get("points", 300)), MAX_HISTORY_POINTS))
+        window = request.args.get("window", type=float)
+        start = request.args.get("start", type=float)
+        end = request.args.get("end", type=float)
+    except ValueError:
+        return jsonify({"error": "invalid points"}), 400
+    method = request.args.get("method", "lttb")
+    by = request.args.get("by")  # comma-separated series to pick points on; default all
+    first, last = history.span()
+    if last is None:
+        return respond_json(history.query(points, start, end, method, by))
+    if window:
+        start = end = None
+    lo = last - window if window else (start if start is not None else first)
+    closed = end is not None and end < last
+    if closed:
+        version = "closed"
+    else:
+        version = int(last // max(SAMPLE_INTERVAL, (last - lo) / points))
+
+    def render():
+        # a window is resolved against the newest sample at render time
+        since = history.span()[1] - window if window else start
+        return dumps(history.query(points, since, end, method, by))
+
+    key = f"history:{points}:{window}:{start}:{end}:{method}:{by}"
+    return respond(history_views.get(key, version, render))
+
+@app.route("/api/mode")
+def get_mode():
+    # cheap mode lookup for the controllers; never triggers a sample
+    return jsonify({"mode": shared.get("mode", "baseline")})
 
 @app.route("/api/mode/<mode>")
 def set_mode(mode):
-    global SYSTEM_MODE, prev_ewma, prev_bytes
     # Change system mode but preserve measurement state so charts are
     # continuous across mode switches (avoids showing artificial zeros).
-    SYSTEM_MODE = mode
-    return jsonify({"mode": SYSTEM_MODE})
+    shared.set("mode", mode)
+    return jsonify({"mode": mode})
 
 @app.route("/api/start-traffic")
 def start_traffic():
-    global traffic_process
-    if traffic_process is None:
+    if shared.get("traffic_pid") is None:
         # Start iperf server on h1 and client on h2
         import subprocess
         try:
@@ -336,13 +643,14 @@ def start_traffic():
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.DEVNULL
             )
+            # the pid is shared so /api/stop works from any worker
+            shared.set("traffic_pid", traffic_process.pid)
         except Exception as e:
             return jsonify({"status": f"error: {str(e)}"}), 500
     return jsonify({"status": "traffic started"})
 
 @app.route("/api/congest")
 def congest():
-    global congestion_active
     try:
         # Start high-traffic UDP floods from h3 and h4
         subprocess.Popen(
@@ -355,23 +663,21 @@ def congest():
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL
         )
-        congestion_active = True
+        shared.set("congestion_active", True)
     except Exception as e:
         return jsonify({"status": f"error: {str(e)}"}), 500
     return jsonify({"status": "congestion triggered"})
 
 @app.route("/api/stop")
 def stop():
-    global traffic_process, congestion_active
-    if traffic_process:
-        traffic_process.terminate()
-        traffic_process = None
-    congestion_active = False
+    traffic_pid = shared.get("traffic_pid")
+    if traffic_pid:
+        try:
+            os.kill(traffic_pid, signal.SIGTERM)
+        except OSError:
+            pass
     # clear demo reroute annotations so the UI returns to normal
-    try:
-        rerouted_links.clear()
-    except Exception:
-        pass
+    shared.set_many({"traffic_pid": None, "congestion_active": False, "rerouted_links": []})
     return jsonify({"status": "stopped"})
 
 
@@ -400,20 +706,68 @@ def reroute_notify():
     """Called by the reroute module to notify the dashboard that a reroute
     has occurred. The dashboard will then measure throughput for a short
     window and report `throughput_proposed` as the observed value.
+
+    Sent once per reroute action (device, out_ports, group_id, the moved
+    flow ids and trace_id), so a batch of flows opens one window.
     """
-    global reroute_event_time, measuring_reroute, proposed_samples
     try:
         # reset samples and start measuring
-        proposed_samples = []
         reroute_event_time = time.time()
-        measuring_reroute = True
+        shared.set("reroute", {"event_time": reroute_event_time, "measuring": True, "samples": [],
+                               "trace_id": (request.get_json(silent=True) or {}).get("trace_id")})
         return jsonify({"status": "measuring", "started": reroute_event_time})
     except Exception:
         return jsonify({"status": "error"}), 500
 
+@app.route('/api/traces', methods=['POST'])
+def record_trace():
+    """Called by the reroute module with one finished reroute trace:
+    stage timestamps and per-stage durations from detection to relief."""
+    trace = request.get_json(silent=True)
+    if not isinstance(trace, dict) or "id" not in trace:
+        return jsonify({"status": "error", "error": "expected a trace object"}), 400
+    shared.update("traces", lambda traces: (traces + [trace])[-MAX_TRACES:], default=[])
+    return jsonify({"status": "recorded", "id": trace["id"]})
+
+
+@app.route('/api/traces')
+def traces():
+    """Per-stage latency histograms of recent reroutes, plus the last `n` traces."""
+    n = request.args.get("n", 20, type=int)
+    recent = shared.get("traces", [])
+    return jsonify({
+        "count": len(recent),
+        "stages": stage_histograms(recent),
+        "recent": recent[-n:] if n > 0 else [],
+    })
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Sample this process for `seconds` (default 10, max 60) while it keeps
+    serving, and return collapsed stacks for a flame graph (format=collapsed,
+    the default), the hottest functions (format=summary, plain text) or both
+    as JSON (format=json; `idle=1` keeps parked threads). Under gunicorn
+    only the worker that takes the request is profiled. Loopback only."""
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"status": "error", "error": "profiling is only served on loopback"}), 403
+    seconds = request.args.get("seconds", 10, type=float)
+    fmt = request.args.get("format", "collapsed")
+    try:
+        prof = profile(seconds, idle=request.args.get("idle", 0, type=int) == 1)
+    except ProfilerBusy as e:
+        return jsonify({"status": "error", "error": str(e)}), 409
+    if fmt == "json":
+        return jsonify(dict(prof.summary(request.args.get("limit", 25, type=int)),
+                            collapsed=prof.collapsed()))
+    body = prof.summary_text(request.args.get("limit", 25, type=int)) if fmt == "summary" else prof.collapsed()
+    return body, 200, {"Content-Type": "text/plain; charset=utf-8"}
+
 # ==============================
 # MAIN
 # ==============================
 if __name__ == "__main__":
     print("🚀 SDN CONTROL CENTER BACKEND STARTED")
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    reset_state()
+    # For many concurrent viewers run under a WSGI server instead, e.g.
+    #   gunicorn -c dashboard/gunicorn.conf.py
+    app.run(host="0.0.0.0", port=5000, debug=True, threaded=True)
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings for serving the dashboard to many concurrent viewers.
+
+Run from the repository root:
+    gunicorn -c dashboard/gunicorn.conf.py
+
+All workers share state through dashboard/state_store.py, so the worker and
+thread counts can be raised freely.
+"""
+import multiprocessing
+import os
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = "backend:app"
+bind = os.environ.get("DASHBOARD_BIND", "0.0.0.0:5000")
+
+workers = int(os.environ.get("DASHBOARD_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 9)))
+worker_class = "gthread"
+threads = int(os.environ.get("DASHBOARD_THREADS", 8))
+timeout = 30
+
+
+def on_starting(server):
+    # reset shared state once for the whole server, before workers fork
+    from backend import reset_state
+    reset_state()
@@ -0,0 +1,178 @@
+"""
+Chart history for the dashboard, with server-side downsampling.
+
+Every published metrics sample is appended to a `history` table next to the
+shared state (same SQLite file), so the full run is available to any worker.
+`/api/history` returns it at a requested point budget, picking points on every
+series with largest-triangle-three-buckets (LTTB) or min/max bucketing and
+keeping the union, so a spike in any series survives.
+Payload size depends on the budget, not on how long the run has been going.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+# chart series kept per sample, in the order charts.js plots them
+SERIES = (
+    "throughput_baseline",
+    "throughput_proposed",
+    "latency_baseline",
+    "latency_proposed",
+    "packet_loss_baseline",
+    "packet_loss_proposed",
+    "ewma_percent",
+    "flows",
+)
+
+RETENTION_SECONDS = 24 * 3600
+MAX_POINTS = 2000
+
+
+# ==============================
+# DOWNSAMPLING
+# ==============================
+def lttb_indices(xs, ys, n):
+    """Indices of the `n` points LTTB keeps from (xs, ys).
+
+    The first and last points are always kept; each bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the average of the next bucket.
+    """
+    size = len(xs)
+    n = max(n, 3)
+    if n >= size:
+        return list(range(size))
+
+    kept = [0]
+    every = (size - 2) / (n - 2)
+    a = 0
+    for i in range(n - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        nxt_start = end
+        nxt_end = min(int((i + 2) * every) + 1, size)
+        if nxt_start >= nxt_end:
+            avg_x, avg_y = xs[size - 1], ys[size - 1]
+        else:
+            span = nxt_end - nxt_start
+            avg_x = sum(xs[nxt_start:nxt_end]) / span
+            avg_y = sum(ys[nxt_start:nxt_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, min(end, size - 1)):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(size - 1)
+    return kept
+
+
+def minmax_indices(ys, n):
+    """Indices of each bucket's minimum and maximum (about `n` points total)."""
+    size = len(ys)
+    if n >= size:
+        return list(range(size))
+    buckets = max(n // 2, 1)
+    every = size / buckets
+    kept = []
+    for b in range(buckets):
+        start = int(b * every)
+        end = max(int((b + 1) * every), start + 1)
+        lo = min(range(start, end), key=ys.__getitem__)
+        hi = max(range(start, end), key=ys.__getitem__)
+        kept.extend(sorted({lo, hi}))
+    return kept
+
+
+def union_indices(rows, columns, points, method="lttb"):
+    """Sorted union of the indices picked on each column of `rows`, with
+    at most `points` entries."""
+    xs = [r[0] for r in rows]
+    cols = [[r[c] for r in rows] for c in columns]
+    budget = points
+    while True:
+        keep = set()
+        for ys in cols:
+            keep.update(minmax_indices(ys, budget) if method == "minmax" else lttb_indices(xs, ys, budget))
+        if len(keep) <= points or budget <= 3:
+            break
+        budget = max(3, min(budget - 1, budget * points // len(keep)))
+    keep = sorted(keep)
+    if len(keep) > points:
+        # only reachable with tiny budgets: thin evenly, keeping both ends
+        step = (len(keep) - 1) / (points - 1)
+        keep = [keep[round(i * step)] for i in range(points)]
+    return keep
+
+
+# ==============================
+# STORAGE
+# ==============================
+class SampleHistory:
+    def __init__(self, path, retention=RETENTION_SECONDS, timeout=10.0):
+        self.path = path
+        self.retention = retention
+        self.timeout = timeout
+        self._local = threading.local()
+        cols = ", ".join(f"{s} REAL" for s in SERIES)
+        self._conn().execute(f"CREATE TABLE IF NOT EXISTS history (ts REAL PRIMARY KEY, {cols})")
+        self._last_prune = 0.0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def append(self, sample):
+        """Record one published sample (called by the sampler lease holder)."""
+        marks = ", ".join("?" * (len(SERIES) + 1))
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO history (ts, {', '.join(SERIES)}) VALUES ({marks})",
+            [sample["sampled_at"]] + [float(sample.get(s) or 0) for s in SERIES],
+        )
+        now = time.time()
+        if now - self._last_prune > 60:
+            conn.execute("DELETE FROM history WHERE ts < ?", (now - self.retention,))
+            self._last_prune = now
+
+    def clear(self):
+        self._conn().execute("DELETE FROM history")
+
+    def span(self):
+        """(first, last) sample time, or (None, None) when empty; an index lookup."""
+        return self._conn().execute("SELECT MIN(ts), MAX(ts) FROM history").fetchone()
+
+    def query(self, points=300, start=None, end=None, method="lttb", by=None):
+        """Return {"t": [...], <series>: [...]} with at most `points` rows.
+
+        Points are picked on every series in `by` (default: all of them) and
+        the union of the picked rows is returned, so a spike in any charted
+        series survives. The per-series budget is shrunk until the union
+        fits in `points`.
+        """
+        points = max(3, min(int(points), MAX_POINTS))
+        picked = [s for s in (by.split(",") if isinstance(by, str) else by or SERIES) if s in SERIES]
+        rows = self._conn().execute(
+            f"SELECT ts, {', '.join(SERIES)} FROM history"
+            " WHERE ts >= ? AND ts <= ? ORDER BY ts",
+            (start if start is not None else 0.0, end if end is not None else float("inf")),
+        ).fetchall()
+
+        total = len(rows)
+        if total > points:
+            keep = union_indices(rows, [1 + SERIES.index(s) for s in picked or SERIES],
+                                 points, method)
+            rows = [rows[i] for i in keep]
+
+        out = {"t": [r[0] for r in rows], "total": total, "method": method}
+        for i, s in enumerate(SERIES):
+            out[s] = [r[1 + i] for r in rows]
+        return out
@@ -0,0 +1,50 @@
+"""
+Histograms of reroute control-loop latency.
+
+The rerouter publishes one trace per reroute (see controller/utils/tracing.py)
+with per-stage durations in milliseconds. This module turns the retained
+traces into fixed-bucket histograms plus percentiles per stage.
+"""
+import math
+
+STAGES = ("decision", "install", "confirm", "relief", "total")
+
+# bucket upper bounds in ms; the last bucket is open-ended
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    i = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[i]
+
+
+def histogram(values):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for v in values:
+        for i, bound in enumerate(BUCKETS_MS):
+            if v <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "buckets": [{"le": b, "count": c} for b, c in zip(BUCKETS_MS + ("+Inf",), counts)],
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+def stage_histograms(traces):
+    """{stage: histogram} over every trace that reached that stage."""
+    out = {}
+    for stage in STAGES:
+        values = [t["durations_ms"][stage] for t in traces
+                  if t.get("durations_ms", {}).get(stage) is not None]
+        out[stage] = histogram(values)
+    return out
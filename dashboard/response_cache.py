@@ -0,0 +1,228 @@
+"""
+Per-version response cache for the dashboard APIs.
+
+`/api/metrics` and `/api/topology` only change once per sampling interval,
+but are polled by every open browser and automation client. The cache
+renders a payload once per data version, keeps the encoded bytes (plus lazily
+built gzip / brotli variants) and hands the same bytes to every client.
+Clients that send a matching `If-None-Match` get a bodyless 304.
+
+orjson and brotli are used when installed; otherwise the standard library
+json encoder and gzip-only compression are used.
+"""
+import gzip
+import hashlib
+import json
+import struct
+import threading
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional compression
+    brotli = None
+
+MIN_COMPRESS_BYTES = 512  # small bodies are not worth compressing
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MAX_VIEWS = 256           # cached topology views per worker; oldest go first
+
+TOPOLOGY_BINARY_MIMETYPE = "application/x-sdn-topology"
+TOPOLOGY_MAGIC = b"SDNT"
+TOPOLOGY_FORMAT_VERSION = 1
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+class CachedResponse:
+    """One rendered payload: the identity body, its ETag and compressed copies."""
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, coding):
+        """Return the body compressed with `coding`, compressing at most once."""
+        body = self._encoded.get(coding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(coding)
+                if body is None:
+                    if coding == "br":
+                        body = brotli.compress(self.body, quality=BROTLI_QUALITY)
+                    else:
+                        body = gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)
+                    self._encoded[coding] = body
+        return body
+
+
+class ResponseCache:
+    """Keeps the latest rendered response per (name, format) and its version.
+
+    Only one version per entry is kept: once the data moves on, the old bytes
+    are never served again. With `max_entries`, the oldest entries are
+    dropped beyond that many; per-view bodies go in their own bounded cache
+    so they never evict the shared ones.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, version, render, mimetype="application/json"):
+        """Return the cached response for `version`, calling `render()` to
+        build the body bytes only when the version changed."""
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            cached = CachedResponse(render(), mimetype)
+            self._entries.pop(name, None)
+            self._entries[name] = (version, cached)
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _accepted_coding(accept_encoding, size):
+    if size < MIN_COMPRESS_BYTES:
+        return None
+    accepted = {c.split(";")[0].strip() for c in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def respond(cached):
+    """Build the Flask response for a cached payload, honouring
+    If-None-Match and Accept-Encoding of the current request."""
+    etag = f'"{cached.etag}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("If-None-Match", "")
+    if etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status=304, headers=headers)
+
+    coding = _accepted_coding(request.headers.get("Accept-Encoding", ""), len(cached.body))
+    body = cached.body
+    if coding:
+        body = cached.encoded(coding)
+        headers["Content-Encoding"] = coding
+    return Response(body, mimetype=cached.mimetype, headers=headers)
+
+
+def respond_json(payload):
+    """Uncached JSON response with the same encoding and compression path."""
+    return respond(CachedResponse(dumps(payload), "application/json"))
+
+
+# ==============================
+# COMPACT TOPOLOGY ENCODING
+# ==============================
+# Layout (all little-endian):
+#   magic "SDNT", u8 format version, u8 reserved (0)
+#   u32 string count, then per string: u16 length + UTF-8 bytes
+#   u32 node count,   then per node:   u32 string index of the device id
+#   u32 link count,   then per link:   u32 from, u32 from-port, u32 to,
+#                                      u32 to-port (string indices),
+#                                      f32 utilization, f32 rate (Mbps),
+#                                      u8 flags (bit0 congested, bit1 rerouted)
+# Link ids are rebuilt as "<from>:<from-port>-<to>:<to-port>".
+_LINK = struct.Struct("<IIIIffB")
+
+
+def encode_topology(topo):
+    strings = []
+    index = {}
+
+    def intern(s):
+        s = str(s)
+        i = index.get(s)
+        if i is None:
+            i = index[s] = len(strings)
+            strings.append(s)
+        return i
+
+    node_idx = [intern(n["id"]) for n in topo.get("nodes", [])]
+    rerouted = set(topo.get("rerouted_links", []))
+    link_rows = []
+    for l in topo.get("links", []):
+        src, dst = l["id"].split("-", 1)
+        src_port = src.rsplit(":", 1)[1]
+        dst_port = dst.rsplit(":", 1)[1]
+        flags = (1 if l.get("congested") else 0) | (2 if l["id"] in rerouted else 0)
+        link_rows.append(_LINK.pack(
+            intern(l["from"]), intern(src_port), intern(l["to"]), intern(dst_port),
+            float(l.get("utilization", 0.0)), float(l.get("rate_mbps", 0.0)), flags,
+        ))
+
+    out = [TOPOLOGY_MAGIC, struct.pack("<BBI", TOPOLOGY_FORMAT_VERSION, 0, len(strings))]
+    for s in strings:
+        b = s.encode("utf-8")
+        out.append(struct.pack("<H", len(b)))
+        out.append(b)
+    out.append(struct.pack("<I", len(node_idx)))
+    out.append(struct.pack(f"<{len(node_idx)}I", *node_idx))
+    out.append(struct.pack("<I", len(link_rows)))
+    out.extend(link_rows)
+    return b"".join(out)
+
+
+def decode_topology(data):
+    """Inverse of encode_topology, returning the JSON-shaped dict."""
+    if data[:4] != TOPOLOGY_MAGIC:
+        raise ValueError("not an encoded topology")
+    _, _, n_strings = struct.unpack_from("<BBI", data, 4)
+    off = 10
+    strings = []
+    for _ in range(n_strings):
+        (n,) = struct.unpack_from("<H", data, off)
+        off += 2
+        strings.append(data[off:off + n].decode("utf-8"))
+        off += n
+    (n_nodes,) = struct.unpack_from("<I", data, off)
+    off += 4
+    nodes = [{"id": strings[i], "label": strings[i]}
+             for i in struct.unpack_from(f"<{n_nodes}I", data, off)]
+    off += 4 * n_nodes
+    (n_links,) = struct.unpack_from("<I", data, off)
+    off += 4
+    links = []
+    rerouted = []
+    for _ in range(n_links):
+        f, fp, t, tp, util, rate, flags = _LINK.unpack_from(data, off)
+        off += _LINK.size
+        lid = f"{strings[f]}:{strings[fp]}-{strings[t]}:{strings[tp]}"
+        links.append({
+            "id": lid, "from": strings[f], "to": strings[t],
+            "utilization": util, "rate_mbps": round(rate, 3), "congested": bool(flags & 1),
+        })
+        if flags & 2:
+            rerouted.append(lid)
+    return {"nodes": nodes, "links": links, "rerouted_links": rerouted}
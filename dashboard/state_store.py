@@ -0,0 +1,179 @@
+"""
+Shared state store for the dashboard backend.
+
+All mutable dashboard state (mode, sampler counters, the latest metrics
+sample, reroute measurements, ...) lives in a small SQLite key/value table
+instead of module globals, so any number of WSGI worker processes and threads
+see the same values. The database is placed on /dev/shm when available, which
+keeps it in shared memory, and runs in WAL mode so reads never wait on the
+single writer.
+
+Values are stored as JSON. Short leases (`try_acquire` / `release`) let one
+worker own a periodic job, e.g. sampling ONOS, while the others keep serving
+the last published result.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+def default_path():
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.environ.get("DASHBOARD_STATE_DB", os.path.join(base, "sdn_dashboard_state.sqlite3"))
+
+
+class _Tx:
+    """get/set bound to a connection that already holds the write lock."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def get(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, updated) VALUES (?, ?, ?)",
+            (key, json.dumps(value, separators=(",", ":")), time.time()),
+        )
+
+    def delete(self, key):
+        self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+
+class StateStore:
+    def __init__(self, path=None, timeout=10.0):
+        self.path = path or default_path()
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        # one connection per thread, re-opened after fork so worker
+        # processes never share a SQLite handle with their parent
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ------------------------------
+    # READS
+    # ------------------------------
+    def get(self, key, default=None):
+        return _Tx(self._conn()).get(key, default)
+
+    def get_many(self, *keys, defaults=None):
+        defaults = defaults or {}
+        marks = ",".join("?" * len(keys))
+        rows = self._conn().execute(
+            f"SELECT key, value FROM kv WHERE key IN ({marks})", keys
+        ).fetchall()
+        found = {k: json.loads(v) for k, v in rows}
+        return {k: found.get(k, defaults.get(k)) for k in keys}
+
+    def updated_at(self, key):
+        row = self._conn().execute("SELECT updated FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def version(self, *keys):
+        """Cheap change marker for a group of keys: their last write times."""
+        marks = ",".join("?" * len(keys))
+        rows = self._conn().execute(
+            f"SELECT key, updated FROM kv WHERE key IN ({marks})", keys
+        ).fetchall()
+        found = dict(rows)
+        return tuple(found.get(k) for k in keys)
+
+    # ------------------------------
+    # WRITES
+    # ------------------------------
+    @contextmanager
+    def transaction(self):
+        """Hold the write lock for a read-modify-write of several keys."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield _Tx(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def set(self, key, value):
+        _Tx(self._conn()).set(key, value)
+
+    def set_many(self, values):
+        with self.transaction() as tx:
+            for key, value in values.items():
+                tx.set(key, value)
+
+    def update(self, key, fn, default=None):
+        """Atomically replace `key` with `fn(current)` and return the result."""
+        with self.transaction() as tx:
+            value = fn(tx.get(key, default))
+            tx.set(key, value)
+        return value
+
+    def delete(self, key):
+        _Tx(self._conn()).delete(key)
+
+    def clear(self):
+        self._conn().execute("DELETE FROM kv")
+
+    # ------------------------------
+    # LEASES
+    # ------------------------------
+    @staticmethod
+    def _owner():
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def try_acquire(self, name, ttl):
+        """Take the lease `name` for `ttl` seconds unless another holder has it.
+
+        Leases expire on their own, so a worker that dies mid-job only blocks
+        the job for `ttl` seconds.
+        """
+        owner = self._owner()
+        now = time.time()
+        with self.transaction() as tx:
+            lease = tx.get(f"lease:{name}")
+            if lease and lease["until"] > now and lease["owner"] != owner:
+                return False
+            tx.set(f"lease:{name}", {"owner": owner, "until": now + ttl})
+        return True
+
+    def renew(self, name, ttl):
+        """Extend our lease `name` to `ttl` seconds from now.
+
+        False if another holder took it meanwhile (ours expired); the
+        caller must then drop its work instead of publishing it.
+        """
+        owner = self._owner()
+        now = time.time()
+        with self.transaction() as tx:
+            lease = tx.get(f"lease:{name}")
+            if lease and lease["owner"] != owner and lease["until"] > now:
+                return False
+            tx.set(f"lease:{name}", {"owner": owner, "until": now + ttl})
+        return True
+
+    def release(self, name):
+        """Drop the lease `name` if we still hold it; never someone else's."""
+        owner = self._owner()
+        with self.transaction() as tx:
+            lease = tx.get(f"lease:{name}")
+            if lease and lease["owner"] == owner:
+                tx.delete(f"lease:{name}")
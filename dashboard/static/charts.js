@@ -132,17 +132,99 @@ function createBarChart(id, label, color) {
 
 const topPortsChart = createBarChart('topPortsChart', 'Top Ports Utilization', '#ff7a7a');
 
+// Chart history is served downsampled by the backend (/api/history), so
+// the charts hold at most ~2x HISTORY_POINTS points however long the run.
+const HISTORY_POINTS = 300;
+// seconds of history shown; null shows the whole run
+let historyWindow = null;
+let historyLoading = false;
+// zoomed {start, end} (epoch seconds), or null when following live data
+let historyZoom = null;
+// epoch seconds of each point on the metrics chart, for drag-to-zoom
+let historyTimes = [];
+
+// series order matches the unified chart datasets
+const HISTORY_SERIES = ['throughput_baseline', 'throughput_proposed', 'latency_baseline',
+    'latency_proposed', 'packet_loss_baseline', 'packet_loss_proposed', 'ewma_percent'];
+
+// Replace chart data with the backend's downsampled history: the last
+// `historyWindow` seconds, or the zoomed `start`..`end` (epoch seconds),
+// which comes back at full resolution once it holds fewer than
+// HISTORY_POINTS samples.
+function loadHistory(start, end) {
+    const params = new URLSearchParams({ points: HISTORY_POINTS });
+    if (start) {
+        params.set('start', start);
+        if (end) params.set('end', end);
+    } else if (historyWindow) {
+        params.set('window', historyWindow);
+    }
+    historyLoading = true;
+    return fetch(`/api/history?${params}`)
+        .then(r => r.json())
+        .then(h => {
+            historyTimes = h.t.slice();
+            const labels = h.t.map(t => new Date(t * 1000).toLocaleTimeString());
+            unifiedChart.data.labels = labels.slice();
+            HISTORY_SERIES.forEach((key, i) => { unifiedChart.data.datasets[i].data = h[key].slice(); });
+            fChart.data.labels = labels.slice();
+            fChart.data.datasets[0].data = h.flows.slice();
+            unifiedChart.update();
+            fChart.update();
+        })
+        .catch(err => console.log('History fetch failed:', err))
+        .finally(() => { historyLoading = false; });
+}
+
+function setHistoryWindow(seconds) {
+    historyWindow = seconds ? Number(seconds) : null;
+    historyZoom = null;
+    const reset = document.getElementById('resetZoomBtn');
+    if (reset) reset.style.display = 'none';
+    loadHistory();
+}
+
+// Zoom: drag across the metrics chart to reload just that time range at a
+// finer resolution. Live points are not appended while zoomed; "Reset zoom"
+// returns to the selected window.
+function zoomHistory(start, end) {
+    historyZoom = { start: start, end: end };
+    const reset = document.getElementById('resetZoomBtn');
+    if (reset) reset.style.display = '';
+    loadHistory(start, end);
+}
+
+(function enableDragZoom(chart) {
+    const canvas = chart.canvas;
+    let from = null;
+    const indexAt = ev => {
+        const i = Math.round(chart.scales.x.getValueForPixel(ev.offsetX));
+        return Math.min(Math.max(i, 0), historyTimes.length - 1);
+    };
+    canvas.addEventListener('mousedown', ev => { from = historyTimes.length ? indexAt(ev) : null; });
+    canvas.addEventListener('mouseup', ev => {
+        if (from === null) return;
+        const to = indexAt(ev);
+        const [a, b] = [Math.min(from, to), Math.max(from, to)];
+        from = null;
+        if (b > a) zoomHistory(historyTimes[a], historyTimes[b]);
+    });
+})(unifiedChart);
+
 function update(chart, ...values) {
+    if (historyLoading || historyZoom) return;
     chart.data.labels.push(new Date().toLocaleTimeString());
+    if (chart === unifiedChart) historyTimes.push(Date.now() / 1000);
     for (let i = 0; i < chart.data.datasets.length; i++) {
+        if (chart.data.datasets[i].isMarker) continue;
         const v = values[i] !== undefined ? values[i] : values[0];
         chart.data.datasets[i].data.push(v);
-        if (chart.data.datasets[i].data.length > 25) {
-            chart.data.datasets[i].data.shift();
-        }
     }
-    if (chart.data.labels.length > 25) chart.data.labels.shift();
     chart.update();
+    // once live points pile up, swap them for a fresh downsampled history
+    if (chart.data.labels.length > 2 * HISTORY_POINTS) {
+        setHistoryWindow(historyWindow);
+    }
 }
 
 function updateStatus(state, mode) {
@@ -422,8 +504,10 @@ function clearMarkers() {
 
 // On load: if traffic already running, start polling automatically
 window.addEventListener('load', () => {
-    // start polling immediately so UI reflects Mininet-driven traffic
-    try { startPolling(); } catch (e) { console.error('Failed to start polling:', e); }
+    // load the run so far, then poll so UI reflects Mininet-driven traffic
+    loadHistory().finally(() => {
+        try { startPolling(); } catch (e) { console.error('Failed to start polling:', e); }
+    });
     const sb = document.getElementById('stopBtn');
     if (sb) sb.disabled = false;
 });
@@ -462,6 +546,13 @@ let topologyNetwork = null;
 let topologyNodes = null;
 let topologyEdges = null;
 
+// Level of detail: the backend lays the tree out and folds every subtree
+// below `topologyDepth` into a cluster node (null shows every switch).
+// Clicking a cluster opens it; clicking an opened cluster folds it again.
+let topologyDepth = 2;
+let topologyNeedsFit = true;
+const expandedClusters = new Set();
+
 function initTopology() {
     const container = document.getElementById('topology');
     topologyNodes = new vis.DataSet();
@@ -470,20 +561,70 @@ function initTopology() {
     const options = {
         nodes: { color: { background: '#072027', border: '#00f7ff' }, font: { color: '#00f7ff' } },
         edges: { color: '#888', width: 2, smooth: true },
-        physics: { stabilization: false, barnesHut: { gravitationalConstant: -3000 } },
+        // positions come from the backend, so no physics simulation runs
+        physics: false,
         interaction: { hover: true }
     };
     topologyNetwork = new vis.Network(container, data, options);
+    topologyNetwork.on('click', params => {
+        if (!params.nodes.length) return;
+        const node = topologyNodes.get(params.nodes[0]);
+        if (node && node.cluster) expandedClusters.add(node.id);
+        else if (node && expandedClusters.has(node.id)) expandedClusters.delete(node.id);
+        else return;
+        refreshTopology();
+    });
+}
+
+function setTopologyDepth(value) {
+    topologyDepth = value === '' ? null : Number(value);
+    expandedClusters.clear();
+    topologyNeedsFit = true;
+    refreshTopology();
+}
+
+function topologyUrl() {
+    if (topologyDepth === null && !expandedClusters.size) return '/api/topology';
+    const params = new URLSearchParams({ depth: topologyDepth === null ? 99 : topologyDepth });
+    if (expandedClusters.size) params.set('expand', [...expandedClusters].join(','));
+    return `/api/topology?${params}`;
+}
+
+// replace a DataSet's contents, dropping items the new view no longer has
+function syncDataSet(ds, items) {
+    const keep = new Set(items.map(i => i.id));
+    ds.remove(ds.getIds().filter(id => !keep.has(id)));
+    ds.update(items);
+}
+
+function utilText(u) {
+    return `${(u * 100).toFixed(1)}%`;
 }
 
 function refreshTopology() {
-    fetch('/api/topology')
+    fetch(topologyUrl())
         .then(r => r.json())
         .then(j => {
             console.log('Topology data received:', j);
             // nodes
-            const nodes = (j.nodes || []).map(n => ({ id: n.id, label: n.label }));
-            topologyNodes.update(nodes);
+            const nodes = (j.nodes || []).map(n => {
+                const node = { id: n.id, label: n.label, x: n.x, y: n.y, cluster: !!n.cluster };
+                if (n.cluster) {
+                    node.shape = 'box';
+                    node.label = `${n.label}\n+${n.switches - 1} switches`;
+                    node.title = `${n.switches} switches (click to expand)\n` +
+                        `Link utilization: max ${utilText(n.utilization)}, mean ${utilText(n.utilization_mean)}` +
+                        `${n.congested ? ' (CONGESTED)' : ''}${n.rerouted ? '\nREROUTED inside' : ''}`;
+                    // a reroute inside a folded cluster shows on its border, like a rerouted link
+                    const border = n.rerouted ? '#4da6ff' : (n.congested ? '#ff4d4d' : '#00f7ff');
+                    node.color = { background: '#072027', border: border };
+                    node.borderWidth = n.rerouted ? 5 : (n.congested ? 3 : 1);
+                } else if (n.expanded && expandedClusters.has(n.id)) {
+                    node.title = 'Click to collapse';
+                }
+                return node;
+            });
+            syncDataSet(topologyNodes, nodes);
 
             // edges
             const edges = (j.links || []).map(l => {
@@ -500,14 +641,17 @@ function refreshTopology() {
                 const titleUtil = (l.rate_mbps !== undefined && l.rate_mbps > 0.01)
                     ? `${l.rate_mbps.toFixed(3)} Mbps`
                     : `${(l.utilization * 100).toFixed(3)}%`;
+                // merged edge between clusters: report the busiest of its links
+                const merged = l.links ? `${l.links} links, max ` : '';
                 return {
                     id: l.id,
                     from: l.from,
                     to: l.to,
                     // show a clearer label: Mbps when available, otherwise percent
-                    label: rer ? `REROUTED ${utilLabel}` : (l.congested ? 'CONGESTED' : utilLabel),
+                    label: rer ? `REROUTED ${utilLabel}` : (l.congested ? 'CONGESTED' : merged + utilLabel),
                     // hover tooltip with exact utilization and state
-                    title: `${rer ? 'REROUTED - ' : ''}Utilization: ${titleUtil}${l.congested ? ' (CONGESTED)' : ''}`,
+                    title: `${rer ? 'REROUTED - ' : ''}${merged}Utilization: ${titleUtil}` +
+                        `${l.links ? `, mean ${utilText(l.utilization_mean)}` : ''}${l.congested ? ' (CONGESTED)' : ''}`,
                     color: color,
                     width: rer ? 5 : (l.congested ? 3 : 2),
                     dashes: rer ? false : (l.congested ? true : false),
@@ -515,7 +659,11 @@ function refreshTopology() {
                     smooth: { enabled: true }
                 };
             });
-            topologyEdges.update(edges);
+            syncDataSet(topologyEdges, edges);
+            if (topologyNeedsFit && nodes.length) {
+                topologyNetwork.fit();
+                topologyNeedsFit = false;
+            }
         })
         .catch(err => { 
             console.log('Topology fetch failed:', err);
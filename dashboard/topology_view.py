@@ -0,0 +1,219 @@
+"""
+Level-of-detail views of the topology for `/api/topology`.
+
+The switch graph is laid out once per topology version, as a tree:
+- a BFS spanning tree is rooted at the graph's center (the middle of a
+  longest shortest path, which is exact for Mininet's tree topologies);
+- leaves are spaced evenly, in device id order;
+- each parent is centered over its children, one row per tree level.
+
+The layout only depends on the devices and links. Every worker therefore
+computes the same positions, and nodes do not move between refreshes.
+
+A view shows the tree down to `depth`, plus the subtrees of the nodes in
+`expand`. Every subtree below a shown node that is not expanded is folded
+into that node, which becomes a cluster. A cluster carries the switch count
+of its subtree and the max and mean utilization of the links inside it; it
+is congested if any of those links is, and rerouted if any of them carries
+a reroute. Links between the same two shown
+nodes are merged into one edge with the same aggregates. The response
+therefore grows with what is on screen, not with the topology.
+"""
+from collections import deque
+
+LEVEL_GAP = 150        # px between tree levels
+SIBLING_GAP = 90       # px between neighbouring leaves
+COMPONENT_GAP = 2      # leaf slots between disconnected components
+MAX_EXPAND = 64        # expanded clusters honoured per request
+
+
+def _bfs(start, adjacency):
+    """(parent map, visit order) of a BFS from `start`, neighbours in id order."""
+    parent = {start: None}
+    order = [start]
+    queue = deque(order)
+    while queue:
+        node = queue.popleft()
+        for nxt in adjacency[node]:
+            if nxt not in parent:
+                parent[nxt] = node
+                order.append(nxt)
+                queue.append(nxt)
+    return parent, order
+
+
+def _center(start, adjacency):
+    """Middle of a longest shortest path of `start`'s component (two BFS sweeps)."""
+    _, order = _bfs(start, adjacency)
+    parent, order = _bfs(order[-1], adjacency)
+    path = [order[-1]]
+    while parent[path[-1]] is not None:
+        path.append(parent[path[-1]])
+    return path[len(path) // 2]
+
+
+class TopologyLayout:
+    def __init__(self, devices, links, version=None):
+        self.version = version
+        adjacency = {d: set() for d in devices}
+        for l in links:
+            adjacency.setdefault(l["from"], set()).add(l["to"])
+            adjacency.setdefault(l["to"], set()).add(l["from"])
+        adjacency = {d: sorted(n - {d}) for d, n in adjacency.items()}
+
+        self.parent = {}
+        self.children = {}
+        self.depth = {}
+        self.order = []             # preorder of all components, roots first
+        self.roots = []
+        for start in sorted(adjacency):
+            if start in self.parent:
+                continue
+            root = _center(start, adjacency)
+            parent, order = _bfs(root, adjacency)
+            self.roots.append(root)
+            for node in order:
+                self.parent[node] = parent[node]
+                self.children[node] = []
+                self.depth[node] = 0 if parent[node] is None else self.depth[parent[node]] + 1
+            for node in order[1:]:
+                self.children[parent[node]].append(node)
+            self.order.extend(self._preorder(root))
+
+        self.max_depth = max(self.depth.values(), default=0)
+
+        # subtree sizes and positions, children before parents
+        self.size = {}
+        self.pos = {}
+        slot = 0
+        for root in self.roots:
+            for node in reversed(self._preorder(root)):
+                kids = self.children[node]
+                self.size[node] = 1 + sum(self.size[c] for c in kids)
+            for node in self._postorder(root):
+                kids = self.children[node]
+                if kids:
+                    x = (self.pos[kids[0]][0] + self.pos[kids[-1]][0]) / 2
+                else:
+                    x = slot * SIBLING_GAP
+                    slot += 1
+                self.pos[node] = (x, self.depth[node] * LEVEL_GAP)
+            slot += COMPONENT_GAP
+
+    def _preorder(self, root):
+        out = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            out.append(node)
+            stack.extend(reversed(self.children[node]))
+        return out
+
+    def _postorder(self, root):
+        out = []
+        stack = [(root, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                out.append(node)
+                continue
+            stack.append((node, True))
+            stack.extend((c, False) for c in reversed(self.children[node]))
+        return out
+
+    # ------------------------------
+    # VIEWS
+    # ------------------------------
+    def view_key(self, depth, expand):
+        """Normalized (depth, expanded ids): `depth` is capped at the tree's
+        deepest level, and unknown ids, leaves and nodes already open at
+        `depth` are dropped, so equal views share a key."""
+        depth = min(max(int(depth), 0), self.max_depth)
+        ids = sorted({n for n in expand
+                      if n in self.depth and self.children[n] and self.depth[n] >= depth})
+        return depth, tuple(ids[:MAX_EXPAND])
+
+    def place(self, topo):
+        """`topo` (the flat get_topology() dict) with positions on its nodes."""
+        nodes = [dict(n, x=self.pos[n["id"]][0], y=self.pos[n["id"]][1], depth=self.depth[n["id"]])
+                 if n["id"] in self.pos else n for n in topo["nodes"]]
+        return dict(topo, nodes=nodes)
+
+    def view(self, topo, depth, expand=()):
+        """Folded view of `topo` for a key from view_key()."""
+        expanded = set(expand)
+        labels = {n["id"]: n.get("label", n["id"]) for n in topo["nodes"]}
+
+        def is_open(node):
+            return self.depth[node] < depth or node in expanded
+
+        # rep: the shown node standing in for each switch (itself, or the
+        # cluster it is folded into)
+        rep = {}
+        for node in self.order:
+            up = self.parent[node]
+            rep[node] = node if up is None or (rep[up] == up and is_open(up)) else rep[up]
+
+        rerouted = set(topo.get("rerouted_links", []))
+        inner = {}                  # cluster -> utilizations of links inside it
+        inner_congested = set()
+        inner_rerouted = set()
+        edges = {}                  # (from rep, to rep) -> links between them
+        for l in topo["links"]:
+            a, b = rep.get(l["from"], l["from"]), rep.get(l["to"], l["to"])
+            if a == b:
+                inner.setdefault(a, []).append(l.get("utilization", 0.0))
+                if l.get("congested"):
+                    inner_congested.add(a)
+                if l["id"] in rerouted:
+                    inner_rerouted.add(a)
+            else:
+                edges.setdefault((a, b), []).append(l)
+
+        nodes = []
+        for node in self.order:
+            if rep[node] != node:
+                continue
+            x, y = self.pos[node]
+            n = {"id": node, "label": labels.get(node, node), "x": x, "y": y,
+                 "depth": self.depth[node]}
+            if self.children[node]:
+                if is_open(node):
+                    n["expanded"] = True
+                else:
+                    utils = inner.get(node, [])
+                    n.update(cluster=True, switches=self.size[node],
+                             utilization=max(utils, default=0.0),
+                             utilization_mean=sum(utils) / len(utils) if utils else 0.0,
+                             congested=node in inner_congested,
+                             rerouted=node in inner_rerouted)
+            nodes.append(n)
+
+        links = []
+        shown_reroutes = []
+        for (a, b), group in edges.items():
+            if len(group) == 1 and group[0]["from"] == a and group[0]["to"] == b:
+                link = group[0]
+            else:
+                utils = [l.get("utilization", 0.0) for l in group]
+                link = {
+                    "id": f"{a}~{b}",
+                    "from": a,
+                    "to": b,
+                    "links": len(group),
+                    "utilization": max(utils),
+                    "utilization_mean": sum(utils) / len(utils),
+                    "rate_mbps": max(l.get("rate_mbps", 0.0) for l in group),
+                    "congested": any(l.get("congested") for l in group),
+                }
+            links.append(link)
+            if any(l["id"] in rerouted for l in group):
+                shown_reroutes.append(link["id"])
+
+        return {
+            "nodes": nodes,
+            "links": links,
+            "rerouted_links": shown_reroutes,
+            "view": {"depth": depth, "expand": list(expand),
+                     "switches": len(self.order), "links": len(topo["links"])},
+        }
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Fake ONOS REST API for load tests and offline development.
+
+Serves the read endpoints the dashboard and controllers poll, for a
+Mininet-style tree topology (`tree,<depth>,<fanout>`), with port counters
+that grow at a fixed random rate per port:
+
+  GET /onos/v1/devices
+  GET /onos/v1/devices/<id>/ports
+  GET /onos/v1/links
+  GET /onos/v1/hosts
+  GET /onos/v1/flows
+  GET /onos/v1/statistics/ports
+
+Every request is counted per endpoint (`calls()`), so a test can report how
+many ONOS calls each client request costs. `delay` adds a fixed service
+time per call to stand in for a real controller.
+
+Usage: python3 scripts/fake_onos.py [--topo tree,3,2] [--port 8181]
+"""
+import argparse
+import collections
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT_SPEED_MBPS = 100
+FLOWS_PER_DEVICE = 4
+_DEVICE_PATH = re.compile(r"^/devices/([^/]+)/ports$")
+
+
+def device_id(n):
+    return f"of:{n:016x}"
+
+
+def tree(depth, fanout):
+    """Switches and directed links of Mininet's TreeTopo.
+
+    Returns ({device: [port numbers]}, [(src dev, src port, dst dev, dst port)],
+    [(host mac, ip, device, port)]). Port 1 of a non-root switch is its
+    uplink; ports 2.. go to its children (switches, or hosts at the leaves).
+    """
+    ports = {}
+    links = []
+    hosts = []
+    level = [device_id(1)]
+    ports[level[0]] = []
+    count = 1
+    for d in range(depth):
+        below = []
+        for parent in level:
+            for c in range(fanout):
+                port = c + 2
+                ports[parent].append(port)
+                if d == depth - 1:
+                    h = len(hosts) + 1
+                    hosts.append((f"00:00:00:00:{h >> 8:02x}:{h & 0xff:02x}",
+                                  f"10.0.{h >> 8}.{h & 0xff}", parent, port))
+                    continue
+                count += 1
+                child = device_id(count)
+                ports[child] = [1]
+                links.append((parent, port, child, 1))
+                links.append((child, 1, parent, port))
+                below.append(child)
+        level = below
+    return ports, links, hosts
+
+
+class FakeOnos:
+    def __init__(self, depth=3, fanout=2, host="127.0.0.1", port=0, delay=0.0, seed=0):
+        self.ports, self.links, self.hosts = tree(depth, fanout)
+        self.delay = delay
+        rng = random.Random(seed)
+        # bytes per second on every port, 1-90% of its speed
+        self.rates = {(dev, p): rng.uniform(0.01, 0.9) * PORT_SPEED_MBPS * 1e6 / 8
+                      for dev, plist in self.ports.items() for p in plist}
+        self.started = time.time()
+        self._calls = collections.Counter()
+        self._lock = threading.Lock()
+        self._static = self._render_static()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fake._serve(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/onos/v1"
+        self._thread = None
+
+    # ------------------------------
+    # RESPONSES
+    # ------------------------------
+    def _render_static(self):
+        out = {
+            "/devices": {"devices": [{"id": d, "type": "SWITCH", "available": True}
+                                     for d in self.ports]},
+            "/links": {"links": [{"src": {"device": s, "port": str(sp)},
+                                  "dst": {"device": d, "port": str(dp)},
+                                  "type": "DIRECT", "state": "ACTIVE"}
+                                 for s, sp, d, dp in self.links]},
+            "/hosts": {"hosts": [{"id": f"{mac}/None", "mac": mac, "ipAddresses": [ip],
+                                  "locations": [{"elementId": dev, "port": str(p)}]}
+                                 for mac, ip, dev, p in self.hosts]},
+            "/flows": {"flows": [{"id": str(i), "deviceId": d, "priority": 40000,
+                                  "state": "ADDED", "selector": {"criteria": []},
+                                  "treatment": {"instructions": []}}
+                                 for i, d in enumerate(d for d in self.ports
+                                                       for _ in range(FLOWS_PER_DEVICE))]},
+        }
+        for dev, plist in self.ports.items():
+            out[f"/devices/{dev}/ports"] = {"ports": [
+                {"port": str(p), "isEnabled": True, "portSpeed": PORT_SPEED_MBPS}
+                for p in plist]}
+        return {path: json.dumps(body).encode() for path, body in out.items()}
+
+    def port_statistics(self):
+        elapsed = time.time() - self.started
+        return json.dumps({"statistics": [
+            {"device": dev, "ports": [
+                {"port": p, "packetsReceived": 0, "packetsSent": 0, "bytesReceived": 0,
+                 "bytesSent": int(self.rates[(dev, p)] * elapsed), "packetsRxDropped": 0,
+                 "packetsTxDropped": 0, "durationSec": int(elapsed)}
+                for p in plist]}
+            for dev, plist in self.ports.items()]}).encode()
+
+    def _serve(self, handler):
+        path = handler.path.split("?", 1)[0]
+        path = path[len("/onos/v1"):] if path.startswith("/onos/v1") else path
+        endpoint = "/devices/{id}/ports" if _DEVICE_PATH.match(path) else path
+        with self._lock:
+            self._calls[endpoint] += 1
+        if self.delay:
+            time.sleep(self.delay)
+        body = self.port_statistics() if path == "/statistics/ports" else self._static.get(path)
+        handler.send_response(200 if body is not None else 404)
+        body = body if body is not None else b'{"code":404,"message":"not found"}'
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    # ------------------------------
+    # CONTROL
+    # ------------------------------
+    def calls(self):
+        """Calls served so far, per endpoint."""
+        with self._lock:
+            return dict(self._calls)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True,
+                                        name="fake-onos")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def parse_topo(spec):
+    """`tree,<depth>,<fanout>` (Mininet's --topo syntax) -> (depth, fanout)."""
+    kind, *args = spec.split(",")
+    if kind != "tree" or len(args) != 2:
+        raise ValueError(f"unsupported topology {spec!r}, expected tree,<depth>,<fanout>")
+    return int(args[0]), int(args[1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--topo", default="tree,3,2")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8181)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every call")
+    args = parser.parse_args()
+
+    onos = FakeOnos(*parse_topo(args.topo), host=args.host, port=args.port, delay=args.delay)
+    print(f"Fake ONOS ({args.topo}: {len(onos.ports)} switches, {len(onos.hosts)} hosts) at {onos.url}")
+    try:
+        onos.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,79 +1,260 @@
 #!/usr/bin/env python3
 """
-Generate comparison plots from CSVs saved by `automated_runner.py`.
-Produces throughput, latency, packet loss overlays and bar summaries.
-Outputs PNGs to `results/`.
+Compare modes across the repeated runs saved by `automated_runner.py`.
+
+Every `results/<mode>_run<n>.csv` is reduced on its own, a chunk of rows at a
+time, to per-bin means on a common relative-time grid (seconds since the
+run's first sample). Runs are therefore compared at the same point of the
+experiment instead of being concatenated end to end, and only one chunk of
+raw samples is in memory at once, whatever the size of the sweep.
+
+The reduced runs of each mode are stacked into a (runs x bins) matrix per
+metric; means, percentiles and bootstrap confidence intervals (resampling
+whole runs, the independent unit) are computed from it with matrix
+operations.
+
+Outputs to `results/`:
+  summary.csv              one row per mode and metric
+  throughput_overlay.png   mean over time per mode, with CI band
+  latency_overlay.png
+  packetloss_bar.png       mean packet loss per mode, with CI
+
+Usage: python3 scripts/generate_plots.py [--results results] [--jobs 4]
 """
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
 import glob
 import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 
-os.makedirs('results', exist_ok=True)
-
-files = glob.glob('results/*_run*.csv')
-if not files:
-    print('No result CSVs found in results/. Run automated_runner first.')
-    exit(1)
-
-# group files by mode prefix
-modes = {}
-for f in files:
-    basename = os.path.basename(f)
-    mode = basename.split('_run')[0]
-    modes.setdefault(mode, []).append(f)
-
-def load_concat(filelist):
-    dfs = []
-    for f in sorted(filelist):
-        df = pd.read_csv(f)
-        dfs.append(df)
-    return pd.concat(dfs, ignore_index=True)
-
-# throughput overlay
-plt.figure(figsize=(8,4))
-for mode, fls in modes.items():
-    df = load_concat(fls)
-    if 'throughput_baseline' in df.columns:
-        series = df['throughput_baseline']
-    elif 'throughput' in df.columns:
-        series = df['throughput']
-    else:
-        continue
-    plt.plot(series.rolling(3).mean(), label=mode)
-plt.legend()
-plt.title('Throughput (smoothed)')
-plt.ylabel('Mbps')
-plt.savefig('results/throughput_overlay.png', bbox_inches='tight')
-
-# latency overlay
-plt.figure(figsize=(8,4))
-for mode, fls in modes.items():
-    df = load_concat(fls)
-    if 'latency_baseline' in df.columns:
-        series = df['latency_baseline']
-    elif 'latency' in df.columns:
-        series = df['latency']
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+METRICS = ("throughput", "latency", "packet_loss")
+UNITS = {"throughput": "Mbps", "latency": "ms", "packet_loss": "%"}
+TIME_COLUMNS = ("ts", "time")
+RUN_FILE = re.compile(r"(.+)_run(\d+)\.csv$")
+
+BIN_SECONDS = 2.0        # automated_runner.py's SAMPLE_INTERVAL
+MAX_SECONDS = 3600       # samples later than this in a run are ignored
+CHUNK_ROWS = 100_000     # rows read from a run file at once
+BOOTSTRAP = 2000         # bootstrap resamples
+CONFIDENCE = 0.95
+REFERENCE_MODE = "baseline"
+
+
+# ==============================
+# PER-RUN REDUCTION
+# ==============================
+def metric_columns(header):
+    """Source column of each metric: the measured `<metric>_baseline` that
+    /api/metrics reports in every mode, or a plain `<metric>` column."""
+    cols = {}
+    for metric in METRICS:
+        for col in (f"{metric}_baseline", metric):
+            if col in header:
+                cols[metric] = col
+                break
+    return cols
+
+
+def reduce_run(path, bin_seconds=BIN_SECONDS, max_seconds=MAX_SECONDS, chunk_rows=CHUNK_ROWS):
+    """Per-bin means of one run as a (len(METRICS), bins) float32 array.
+
+    Bins without samples, and metrics the file does not have, are NaN.
+    Without a time column, rows are assumed `bin_seconds` apart.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    cols = metric_columns(header)
+    time_col = next((c for c in TIME_COLUMNS if c in header), None)
+    usecols = list(cols.values()) + ([time_col] if time_col else [])
+
+    n_bins = int(np.ceil(max_seconds / bin_seconds))
+    sums = np.zeros((len(METRICS), n_bins))
+    counts = np.zeros((len(METRICS), n_bins))
+    t0 = None
+    row = 0
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+        if time_col:
+            t = pd.to_numeric(chunk[time_col], errors="coerce").to_numpy(float)
+            if t0 is None:
+                valid = t[np.isfinite(t)]
+                if not len(valid):
+                    continue
+                t0 = valid[0]
+            rel = t - t0
+        else:
+            rel = (row + np.arange(len(chunk))) * bin_seconds
+        row += len(chunk)
+
+        bins = np.floor(rel / bin_seconds)
+        in_range = (bins >= 0) & (bins < n_bins)
+        for i, metric in enumerate(METRICS):
+            if metric not in cols:
+                continue
+            v = pd.to_numeric(chunk[cols[metric]], errors="coerce").to_numpy(float)
+            ok = in_range & np.isfinite(v)
+            idx = bins[ok].astype(np.intp)
+            sums[i] += np.bincount(idx, weights=v[ok], minlength=n_bins)
+            counts[i] += np.bincount(idx, minlength=n_bins)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums / counts).astype(np.float32)
+
+
+def find_runs(results_dir):
+    """{mode: [csv paths]} for every `<mode>_run<n>.csv`, ordered by n."""
+    runs = {}
+    for path in glob.glob(os.path.join(results_dir, "*_run*.csv")):
+        m = RUN_FILE.match(os.path.basename(path))
+        if m:
+            runs.setdefault(m.group(1), []).append((int(m.group(2)), path))
+    return {mode: [p for _, p in sorted(paths)] for mode, paths in sorted(runs.items())}
+
+
+def load_modes(runs, jobs=1):
+    """{mode: (runs, len(METRICS), bins) array}, trimmed to the longest run."""
+    reduced = {}
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            for mode, paths in runs.items():
+                reduced[mode] = np.stack(list(pool.map(reduce_run, paths, chunksize=8)))
     else:
-        continue
-    plt.plot(series.rolling(3).mean(), label=mode)
-plt.legend()
-plt.title('Latency (smoothed)')
-plt.ylabel('ms')
-plt.savefig('results/latency_overlay.png', bbox_inches='tight')
-
-# packet loss bar (mean)
-means = {}
-for mode, fls in modes.items():
-    df = load_concat(fls)
-    if 'packet_loss_baseline' in df.columns:
-        means[mode] = df['packet_loss_baseline'].mean()
-    elif 'packet_loss' in df.columns:
-        means[mode] = df['packet_loss'].mean()
-
-plt.figure(figsize=(6,4))
-plt.bar(list(means.keys()), list(means.values()))
-plt.title('Average Packet Loss')
-plt.savefig('results/packetloss_bar.png', bbox_inches='tight')
-
-print('Plots saved to results/')
+        for mode, paths in runs.items():
+            reduced[mode] = np.stack([reduce_run(p) for p in paths])
+
+    has_data = np.logical_or.reduce([np.isfinite(x).any(axis=(0, 1)) for x in reduced.values()])
+    last = int(np.flatnonzero(has_data)[-1]) + 1 if has_data.any() else 0
+    return {mode: x[:, :, :last] for mode, x in reduced.items()}
+
+
+# ==============================
+# STATISTICS
+# ==============================
+def bootstrap_weights(n_runs, n_boot, rng):
+    """(n_boot, n_runs) matrix of how often each run is drawn per resample."""
+    return rng.multinomial(n_runs, np.full(n_runs, 1.0 / n_runs), size=n_boot).astype(np.float32)
+
+
+def resampled_means(weights, values):
+    """Column means of `values` (runs x k, NaN = missing) under every
+    resample's weights, as an (n_boot, k) array."""
+    present = np.isfinite(values)
+    num = weights @ np.where(present, values, 0).astype(np.float32)
+    den = weights @ present.astype(np.float32)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return num / den
+
+
+def interval(samples, confidence=CONFIDENCE):
+    """Percentile interval over the first axis, ignoring NaN resamples."""
+    tail = (1 - confidence) / 2 * 100
+    return np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+
+
+def summarize(modes, n_boot=BOOTSTRAP, seed=0, reference=REFERENCE_MODE):
+    """Summary table plus the per-bin series used by the figures.
+
+    Run means are bootstrapped for the CI of each mode's mean; the
+    difference to the reference mode uses independent resamples of both.
+    Percentiles pool every binned sample of the mode.
+    """
+    rng = np.random.default_rng(seed)
+    boot_means = {}
+    series = {}
+    rows = []
+    for mode, x in modes.items():
+        weights = bootstrap_weights(len(x), n_boot, rng)
+        with warnings.catch_warnings():
+            # all-NaN bins (no run reached them) are expected
+            warnings.simplefilter("ignore", RuntimeWarning)
+            run_means = np.nanmean(x, axis=2)                      # runs x metrics
+            boot_means[mode] = resampled_means(weights, run_means)  # n_boot x metrics
+            series[mode] = {}
+            for i, metric in enumerate(METRICS):
+                per_bin = resampled_means(weights, x[:, i, :])      # n_boot x bins
+                series[mode][metric] = (np.nanmean(x[:, i, :], axis=0), *interval(per_bin))
+            pooled = x.transpose(1, 0, 2).reshape(len(METRICS), -1)
+            pct = np.nanpercentile(pooled, [50, 95, 99], axis=1)     # 3 x metrics
+            lo, hi = interval(boot_means[mode])
+        for i, metric in enumerate(METRICS):
+            rows.append({
+                "mode": mode, "metric": metric, "unit": UNITS[metric], "runs": len(x),
+                "mean": np.nanmean(run_means[:, i]), "ci_low": lo[i], "ci_high": hi[i],
+                "p50": pct[0, i], "p95": pct[1, i], "p99": pct[2, i],
+            })
+
+    table = pd.DataFrame(rows)
+    if reference in boot_means:
+        ref = boot_means[reference]
+        diffs = {mode: interval(b - ref) for mode, b in boot_means.items()}
+        ref_mean = table[table["mode"] == reference].set_index("metric")["mean"]
+        table["diff_vs_" + reference] = table["mean"] - table["metric"].map(ref_mean)
+        table["diff_ci_low"] = [diffs[m][0][METRICS.index(k)] for m, k in zip(table["mode"], table["metric"])]
+        table["diff_ci_high"] = [diffs[m][1][METRICS.index(k)] for m, k in zip(table["mode"], table["metric"])]
+    return table, series
+
+
+# ==============================
+# FIGURES
+# ==============================
+def plot_overlay(series, metric, path, bin_seconds=BIN_SECONDS):
+    plt.figure(figsize=(8, 4))
+    for mode, by_metric in series.items():
+        mean, lo, hi = by_metric[metric]
+        t = np.arange(len(mean)) * bin_seconds
+        line, = plt.plot(t, mean, label=mode)
+        plt.fill_between(t, lo, hi, color=line.get_color(), alpha=0.2, linewidth=0)
+    plt.legend()
+    plt.title(f"{metric.replace('_', ' ').capitalize()} (mean, {CONFIDENCE:.0%} CI)")
+    plt.xlabel("Time since run start (s)")
+    plt.ylabel(UNITS[metric])
+    plt.savefig(path, bbox_inches="tight")
+    plt.close()
+
+
+def plot_bar(table, metric, path):
+    rows = table[table["metric"] == metric]
+    err = [rows["mean"] - rows["ci_low"], rows["ci_high"] - rows["mean"]]
+    plt.figure(figsize=(6, 4))
+    plt.bar(rows["mode"], rows["mean"], yerr=err, capsize=4)
+    plt.title(f"Average {metric.replace('_', ' ').title()} ({CONFIDENCE:.0%} CI)")
+    plt.ylabel(UNITS[metric])
+    plt.savefig(path, bbox_inches="tight")
+    plt.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--results", default="results", help="directory with <mode>_run<n>.csv")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="processes reducing run files in parallel")
+    parser.add_argument("--bootstrap", type=int, default=BOOTSTRAP)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    runs = find_runs(args.results)
+    if not runs:
+        print(f"No result CSVs found in {args.results}/. Run automated_runner first.")
+        raise SystemExit(1)
+
+    modes = load_modes(runs, jobs=args.jobs)
+    table, series = summarize(modes, n_boot=args.bootstrap, seed=args.seed)
+
+    out = args.results
+    table.to_csv(os.path.join(out, "summary.csv"), index=False, float_format="%.4g")
+    plot_overlay(series, "throughput", os.path.join(out, "throughput_overlay.png"))
+    plot_overlay(series, "latency", os.path.join(out, "latency_overlay.png"))
+    plot_bar(table, "packet_loss", os.path.join(out, "packetloss_bar.png"))
+
+    with pd.option_context("display.width", 160, "display.max_columns", None):
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+    print(f"Summary and plots saved to {out}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Load test for the dashboard API with many concurrent clients.
+
+Starts a fake ONOS (`fake_onos.py`) and the dashboard backend wired to it
+(gunicorn with `dashboard/gunicorn.conf.py` when installed, the Flask server
+otherwise). Then it sweeps over client counts. Two kinds of clients are
+simulated, each polling exactly what the real one polls:
+
+  page     an open dashboard page (charts.js): /api/metrics (startPolling)
+           and /api/topology at the page's default detail, depth=2
+           (refreshTopology), each on its own 2 s setInterval. Responses
+           are revalidated with If-None-Match, as the browser cache does with
+           the ETag + no-cache headers. A late response never delays the
+           next request, so latency is measured from the scheduled send time.
+  runner   scripts/automated_runner.py's poll_metrics(): /api/metrics, then
+           a SAMPLE_INTERVAL (2 s) sleep after each response, without ETags.
+
+The one-off requests of a page load (/api/history, mode buttons) are not
+simulated.
+
+Per step, the report has:
+- requests per second, p50/p95/p99 latency and error rate per endpoint
+  (runner requests are listed as "runner /api/metrics"); percentiles are
+  null when no request succeeded, and failed_p50_ms / failed_p99_ms give
+  the latency of the failed ones;
+- the ONOS calls made during the step, per endpoint and per client request.
+
+It is written as JSON with sorted keys, so two builds diff line by line.
+`--compare` prints the change against an earlier report.
+
+Usage: python3 scripts/load_test.py [--clients 1,10,50,100] [--runners 1]
+                                    [--duration 20] [--topo tree,3,2]
+                                    [--compare old.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+from fake_onos import FakeOnos, parse_topo
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PAGE_MIX = {                 # endpoint -> setInterval period (s), from charts.js
+    "/api/metrics": 2.0,
+    "/api/topology?depth=2": 2.0,
+}
+RUNNER_MIX = {               # endpoint -> sleep between polls (s), from automated_runner.py
+    "/api/metrics": 2.0,
+}
+RUNNER_LABEL = "runner "     # prefix of runner endpoints in the report
+REQUEST_TIMEOUT = 10
+STARTUP_TIMEOUT = 20
+
+
+# ==============================
+# BACKEND
+# ==============================
+def start_backend(port, onos_url, workdir, workers, threads):
+    """Launch the backend on 127.0.0.1:`port` and wait until it answers."""
+    env = dict(os.environ,
+               SDN_ONOS_URL=onos_url,
+               SDN_SNAPSHOT_DIR=workdir,
+               DASHBOARD_STATE_DB=os.path.join(workdir, "state.sqlite3"),
+               DASHBOARD_BIND=f"127.0.0.1:{port}",
+               DASHBOARD_WORKERS=str(workers),
+               DASHBOARD_THREADS=str(threads))
+    if shutil.which("gunicorn"):
+        cmd = ["gunicorn", "-c", os.path.join(ROOT, "dashboard", "gunicorn.conf.py")]
+        server = f"gunicorn ({workers} workers x {threads} threads)"
+    else:
+        cmd = [sys.executable, "-c",
+               "import backend; backend.reset_state(); "
+               f"backend.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+        server = "flask (threaded)"
+    log = open(os.path.join(workdir, "backend.log"), "w")
+    proc = subprocess.Popen(cmd, cwd=os.path.join(ROOT, "dashboard"), env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/traffic-status", timeout=1)
+            return proc, server
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit(f"Backend did not start; see {log.name}")
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ==============================
+# CLIENTS
+# ==============================
+def poll_endpoint(base, path, interval, start, measure_from, end, out):
+    """One page's schedule for one endpoint; appends (latency, ok) of the
+    requests scheduled inside the measurement window to `out`."""
+    session = requests.Session()
+    etag = None
+    scheduled = start + np.random.uniform(0, interval)
+    while scheduled < end:
+        wait = scheduled - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        headers = {"If-None-Match": etag} if etag else {}
+        try:
+            r = session.get(base + path, headers=headers, timeout=REQUEST_TIMEOUT)
+            r.content
+            ok = r.status_code in (200, 304)
+            etag = r.headers.get("ETag", etag)
+        except requests.RequestException:
+            ok = False
+        if scheduled >= measure_from:
+            out.append((time.time() - scheduled, ok))
+        scheduled += interval
+
+
+def poll_sequential(base, path, interval, start, measure_from, end, out):
+    """One runner polling `path` like automated_runner.poll_metrics: the
+    next request is sent `interval` s after the previous response."""
+    session = requests.Session()
+    time.sleep(max(start + np.random.uniform(0, interval) - time.time(), 0))
+    while time.time() < end:
+        sent = time.time()
+        try:
+            r = session.get(base + path, timeout=REQUEST_TIMEOUT)
+            r.content
+            ok = r.status_code == 200
+        except requests.RequestException:
+            ok = False
+        if sent >= measure_from:
+            out.append((time.time() - sent, ok))
+        time.sleep(interval)
+
+
+def run_clients(job):
+    """Worker process: run `pages` simulated pages and `runners` runners,
+    return per-endpoint (ok latencies, failed latencies)."""
+    base, pages, runners, start, measure_from, end = job
+    np.random.seed(os.getpid())
+    work = [(poll_endpoint, path, path, interval)
+            for _ in range(pages) for path, interval in PAGE_MIX.items()]
+    work += [(poll_sequential, RUNNER_LABEL + path, path, interval)
+             for _ in range(runners) for path, interval in RUNNER_MIX.items()]
+    results = {label: [] for _, label, _, _ in work}
+    threads = [threading.Thread(target=poll, daemon=True,
+                                args=(base, path, interval, start, measure_from, end, results[label]))
+               for poll, label, path, interval in work]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(end - time.time() + REQUEST_TIMEOUT + 1)
+    return {label: ([lat for lat, ok in samples if ok], [lat for lat, ok in samples if not ok])
+            for label, samples in results.items()}
+
+
+def split(total, procs):
+    return [total // procs + (i < total % procs) for i in range(procs)]
+
+
+def run_step(base, onos, clients, runners, duration, warmup, procs):
+    """Drive `clients` pages and `runners` runners for warmup + duration
+    seconds; returns the step report."""
+    procs = max(1, min(procs, clients + runners))
+    start = time.time() + 1.0
+    measure_from = start + warmup
+    end = measure_from + duration
+    jobs = [(base, p, r, start, measure_from, end)
+            for p, r in zip(split(clients, procs), split(runners, procs))]
+    with multiprocessing.Pool(procs) as pool:
+        pending = pool.map_async(run_clients, jobs)
+        time.sleep(max(measure_from - time.time(), 0))
+        calls_before = onos.calls()
+        time.sleep(max(end - time.time(), 0))
+        calls_after = onos.calls()
+        parts = pending.get()
+
+    endpoints = {}
+    all_ok, all_failed = [], []
+    for label in sorted({label for p in parts for label in p}):
+        ok = [lat for p in parts for lat in p.get(label, ([], []))[0]]
+        failed = [lat for p in parts for lat in p.get(label, ([], []))[1]]
+        endpoints[label] = summarize(ok, failed, duration)
+        all_ok += ok
+        all_failed += failed
+    total = summarize(all_ok, all_failed, duration)
+    onos_calls = {path: n - calls_before.get(path, 0) for path, n in calls_after.items()
+                  if n > calls_before.get(path, 0)}
+    return {
+        "clients": clients,
+        "runners": runners,
+        "endpoints": endpoints,
+        "all": total,
+        "onos_calls": onos_calls,
+        "onos_calls_per_request": round(sum(onos_calls.values()) / max(total["requests"], 1), 4),
+    }
+
+
+def percentiles(latencies):
+    """p50/p95/p99 in ms, or None each when there is no sample (never NaN,
+    which json.dump would write as invalid JSON)."""
+    if not latencies:
+        return None, None, None
+    return tuple(round(float(p), 2) for p in np.percentile(np.asarray(latencies) * 1000, [50, 95, 99]))
+
+
+def summarize(ok, failed, duration):
+    n = len(ok) + len(failed)
+    p50, p95, p99 = percentiles(ok)
+    f50, _, f99 = percentiles(failed)
+    return {
+        "requests": n,
+        "throughput_rps": round(len(ok) / duration, 2),
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "failed_p50_ms": f50,
+        "failed_p99_ms": f99,
+        "error_rate": round(len(failed) / n, 4) if n else 0.0,
+    }
+
+
+# ==============================
+# REPORT
+# ==============================
+def git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except OSError:
+        return "unknown"
+
+
+def ms(value):
+    return "-" if value is None else value
+
+
+def print_step(step):
+    print(f"\n{step['clients']} clients + {step['runners']} runners, "
+          f"{step['onos_calls_per_request']} ONOS calls/request")
+    print(f"  {'endpoint':<29}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for path, s in list(step["endpoints"].items()) + [("all", step["all"])]:
+        print(f"  {path:<29}{s['throughput_rps']:>9}{ms(s['p50_ms']):>9}{ms(s['p95_ms']):>9}"
+              f"{ms(s['p99_ms']):>9}{s['error_rate']:>8.1%}")
+
+
+def print_comparison(report, old):
+    print(f"\nChange vs {old['build']} (p99 ms, req/s, ONOS calls/request):")
+    old_steps = {s["clients"]: s for s in old["steps"]}
+    for step in report["steps"]:
+        prev = old_steps.get(step["clients"])
+        if prev is None:
+            continue
+        a, b = prev["all"], step["all"]
+        print(f"  {step['clients']:>5} clients: p99 {a['p99_ms']} -> {b['p99_ms']}, "
+              f"req/s {a['throughput_rps']} -> {b['throughput_rps']}, "
+              f"ONOS {prev['onos_calls_per_request']} -> {step['onos_calls_per_request']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", default="1,10,50,100", help="comma-separated page counts")
+    parser.add_argument("--runners", type=int, default=1,
+                        help="automated_runner.py pollers alongside the pages of every step")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per step")
+    parser.add_argument("--warmup", type=float, default=4, help="unmeasured seconds per step")
+    parser.add_argument("--topo", default="tree,3,2", help="fake ONOS topology")
+    parser.add_argument("--onos-delay", type=float, default=0.01, help="fake ONOS service time (s)")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--procs", type=int, default=max((os.cpu_count() or 2) // 2, 1),
+                        help="load generator processes")
+    parser.add_argument("--out", default=os.path.join("results", "loadtest.json"))
+    parser.add_argument("--compare", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    onos = FakeOnos(*parse_topo(args.topo), delay=args.onos_delay).start()
+    workdir = tempfile.mkdtemp(prefix="sdn-loadtest-")
+    port = free_port()
+    backend, server = start_backend(port, onos.url, workdir, args.workers, args.threads)
+    base = f"http://127.0.0.1:{port}"
+    print(f"Backend: {server} at {base}; fake ONOS {args.topo} "
+          f"({len(onos.ports)} switches) at {onos.url}")
+
+    report = {
+        "build": git_revision(),
+        "config": {"server": server, "topo": args.topo, "onos_delay_s": args.onos_delay,
+                   "duration_s": args.duration, "warmup_s": args.warmup,
+                   "page_mix": PAGE_MIX, "runner_mix": RUNNER_MIX, "runners": args.runners},
+        "steps": [],
+    }
+    try:
+        for clients in (int(c) for c in args.clients.split(",")):
+            step = run_step(base, onos, clients, args.runners, args.duration, args.warmup,
+                            args.procs)
+            report["steps"].append(step)
+            print_step(step)
+    finally:
+        backend.terminate()
+        backend.wait(10)
+        onos.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2, sort_keys=True, allow_nan=False)
+        fh.write("\n")
+    print(f"\nReport saved to {args.out}")
+    if args.compare:
+        with open(args.compare) as fh:
+            print_comparison(report, json.load(fh))
+
+
+if __name__ == "__main__":
+    main()
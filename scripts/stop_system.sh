@@ -9,5 +9,6 @@ pkill -f congestion_detection.py
 pkill -f ewma_prediction.py
 pkill -f reroute.py
 pkill -f backend.py
+pkill -f "gunicorn -c dashboard/gunicorn.conf.py"
 
 echo "✅ System stopped cleanly"